@@ -0,0 +1,71 @@
+import json
+import os
+
+
+class JsonObjectWriter:
+    """Write a JSON object to a file one member at a time, without holding the whole object in memory.
+
+    Members are written as they come, nested objects can be streamed entry by
+    entry with write_items(). With indent the output is the same as
+    json.dump(obj, f, indent=indent), without it the output is compact. The
+    file is written to a temporary path and moved into place on close, so
+    readers never see a partial file.
+    """
+
+    def __init__(self, path, indent=None, default=None):
+        self.path = path
+        self.indent = indent
+        self.default = default
+        self._tmp_path = f"{path}.tmp"
+        self._file = open(self._tmp_path, 'w')
+        self._file.write('{')
+        self._members = 0
+
+    def _newline(self, level):
+        return '\n' + ' ' * (self.indent * level) if self.indent is not None else ''
+
+    def _dumps(self, value, level):
+        separators = (',', ': ') if self.indent is not None else (',', ':')
+        text = json.dumps(value, indent=self.indent, separators=separators, default=self.default)
+        # json.dumps escapes newlines inside strings, so every newline here is structural
+        return text.replace('\n', self._newline(level)) if self.indent is not None else text
+
+    def _key(self, key, level):
+        separator = ',' if self._members else ''
+        colon = ': ' if self.indent is not None else ':'
+        self._file.write(f"{separator}{self._newline(level)}{json.dumps(key)}{colon}")
+        self._members += 1
+
+    def write(self, key, value):
+        """Write one member"""
+        self._key(key, 1)
+        self._file.write(self._dumps(value, 1))
+
+    def write_items(self, key, items):
+        """Write one member holding an object built from (key, value) pairs, one pair at a time"""
+        self._key(key, 1)
+        colon = ': ' if self.indent is not None else ':'
+        self._file.write('{')
+        count = 0
+        for item_key, value in items:
+            separator = ',' if count else ''
+            self._file.write(f"{separator}{self._newline(2)}{json.dumps(item_key)}{colon}{self._dumps(value, 2)}")
+            count += 1
+        self._file.write(f"{self._newline(1)}}}" if count else '}')
+
+    def close(self):
+        """Finish the object and move the file into place"""
+        self._file.write(f"{self._newline(0)}}}" if self._members else '}')
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Leave the previous file in place rather than a partial one
+            self._file.close()
+            os.remove(self._tmp_path)
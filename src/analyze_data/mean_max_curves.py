@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from src.analyze_data.rolling_metrics import resample_1hz
+from src.export_data.stream_store import consolidate, read_index, scan_streams
+from src.export_data.zones import CYCLING_SPORT_TYPES
+
+# Run from the repository root: python -m src.analyze_data.mean_max_curves [--rebuild]
+# Per-activity curves are cached once, the all-time envelope is folded in incrementally
+STATE_DIR = Path("src/analyze_data/state/mean_max")
+CURVES_DIR = STATE_DIR / "activities"
+ENVELOPES_PATH = STATE_DIR / "all_time.npz"
+STATE_PATH = STATE_DIR / "state.json"
+OUTPUT_PATH = Path("src/analyze_data/data/mean_max_curves.json")
+
+# Curves cover every duration from 1 s to 5 h, index i holds duration i + 1 seconds
+MAX_DURATION = 5 * 60 * 60
+# Recent envelopes in days, counted back from now
+WINDOWS = (90, 28)
+# Durations reported to the LLM
+REPORT_DURATIONS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 5400, 7200, 10800, 14400, 18000)
+
+
+def mean_max(values, max_duration=MAX_DURATION):
+    """Best average of a 1 Hz series for every duration up to max_duration.
+
+    With cumulative sums the sum of any window is one subtraction, so each
+    duration is a single vectorised pass over the series instead of
+    re-summing every window.
+    """
+    durations = min(len(values), max_duration)
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    curve = np.empty(durations)
+    for duration in range(1, durations + 1):
+        curve[duration - 1] = (cumulative[duration:] - cumulative[:-duration]).max() / duration
+    return curve
+
+
+def activity_curves(frame, sport_type):
+    """Mean-maximal power and speed curves of one activity's 1 Hz grid frame, by envelope name.
+
+    Power curves are computed for rides only, speed curves are kept per sport
+    type. Null seconds on the grid count as 0.
+    """
+    curves = {}
+    if frame is None or frame.is_empty():
+        return curves
+    channels = {'speed': 'velocity_smooth'}
+    if sport_type in CYCLING_SPORT_TYPES:
+        channels['power'] = 'watts'
+    for metric, column in channels.items():
+        if frame[column].null_count() == frame.height:
+            continue
+        name = 'power' if metric == 'power' else f"speed_{sport_type}"
+        curves[name] = mean_max(frame[column].fill_null(0).cast(pl.Float64).to_numpy())
+    return curves
+
+
+def _padded(curve):
+    padded = np.full(MAX_DURATION, np.nan)
+    padded[:len(curve)] = curve
+    return padded
+
+
+def merge_curve(envelope, curve, activity_id):
+    """Fold one activity's curve into an envelope of (best values, activity holding each best)"""
+    curve = _padded(curve)
+    if envelope is None:
+        return curve, np.where(np.isnan(curve), -1, int(activity_id))
+    best, holders = envelope
+    better = np.nan_to_num(curve, nan=-np.inf) > np.nan_to_num(best, nan=-np.inf)
+    return np.where(better, curve, best), np.where(better, int(activity_id), holders)
+
+
+def load_state():
+    """Curves already cached per activity (with their sport type and start date) and the all-time envelopes"""
+    state = {'activities': {}}
+    if STATE_PATH.exists():
+        with open(STATE_PATH) as f:
+            state = json.load(f)
+    envelopes = {}
+    if ENVELOPES_PATH.exists():
+        with np.load(ENVELOPES_PATH) as stored:
+            for key in stored.files:
+                if key.endswith('__best'):
+                    name = key[:-len('__best')]
+                    envelopes[name] = (stored[key], stored[f"{name}__holders"])
+    return state, envelopes
+
+
+def save_state(state, envelopes):
+    """Write the all-time envelopes, then the state listing the activities folded into them"""
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    arrays = {}
+    for name, (best, holders) in envelopes.items():
+        arrays[f"{name}__best"] = best
+        arrays[f"{name}__holders"] = holders
+    tmp_path = ENVELOPES_PATH.with_name("all_time.tmp.npz")
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, ENVELOPES_PATH)
+
+    tmp_path = STATE_PATH.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, STATE_PATH)
+
+
+def load_curves(activity_id):
+    with np.load(CURVES_DIR / f"{activity_id}.npz") as stored:
+        return {name: stored[name] for name in stored.files}
+
+
+def _grid_frames(grid, activity_ids):
+    """Per-activity frames of the given activities on a 1 Hz grid"""
+    grid = grid.lazy().filter(pl.col('activity_id').is_in([int(activity_id) for activity_id in activity_ids])).collect()
+    return {str(key[0]): frame for key, frame in grid.partition_by('activity_id', as_dict=True).items()}
+
+
+def update_curves(grid=None, index=None):
+    """Compute and cache the curves of activities not seen before and fold them into the all-time envelopes.
+
+    grid is the 1 Hz grid from resample_1hz() if the caller already built one,
+    new activities it does not cover are resampled from the store. Returns the
+    state and the all-time envelopes.
+    """
+    index = index or read_index()
+    state, envelopes = load_state()
+    CURVES_DIR.mkdir(parents=True, exist_ok=True)
+
+    new = sorted((activity_id for activity_id in index['activities'] if activity_id not in state['activities']), key=int)
+    frames = {}
+    if new and grid is not None:
+        frames = _grid_frames(grid, new)
+    missing = [activity_id for activity_id in new if activity_id not in frames]
+    if missing:
+        frames.update(_grid_frames(resample_1hz(scan_streams(activity_ids=missing)), missing))
+    for activity_id in new:
+        entry = index['activities'][activity_id]
+        curves = activity_curves(frames.get(activity_id), entry['sport_type'])
+        np.savez(CURVES_DIR / f"{activity_id}.npz", **curves)
+        for name, curve in curves.items():
+            envelopes[name] = merge_curve(envelopes.get(name), curve, activity_id)
+        state['activities'][activity_id] = {'sport_type': entry['sport_type'], 'start_date': entry['start_date']}
+
+    if new:
+        save_state(state, envelopes)
+    print(f"Computed mean-maximal curves for {len(new)} new activities")
+    return state, envelopes
+
+
+def window_envelopes(state, days, now=None):
+    """Envelopes over the cached curves of the activities that started in the last `days` days"""
+    now = now or datetime.now(timezone.utc)
+    start = (now - timedelta(days=days)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    envelopes = {}
+    for activity_id, entry in sorted(state['activities'].items(), key=lambda item: int(item[0])):
+        if entry['start_date'] < start:
+            continue
+        for name, curve in load_curves(activity_id).items():
+            envelopes[name] = merge_curve(envelopes.get(name), curve, activity_id)
+    return envelopes
+
+
+def report(envelopes):
+    """Envelope values at the reported durations, with the activity that holds each best"""
+    reported = {}
+    for name, (best, holders) in sorted(envelopes.items()):
+        points = []
+        for duration in REPORT_DURATIONS:
+            value = best[duration - 1]
+            if np.isnan(value):
+                break
+            point = {'duration_s': duration, 'activity_id': int(holders[duration - 1])}
+            if name == 'power':
+                point['watts'] = round(float(value), 1)
+            else:
+                point['speed_mps'] = round(float(value), 3)
+                if value > 0:
+                    point['pace_min_per_km'] = round(1000 / value / 60, 2)
+            points.append(point)
+        reported[name] = points
+    return reported
+
+
+def mean_max_summary(state, all_time, now=None):
+    """All-time and recent mean-maximal envelopes at the reported durations"""
+    summary = {'all_time': report(all_time)}
+    for days in WINDOWS:
+        summary[f'last_{days}_days'] = report(window_envelopes(state, days, now))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain mean-maximal power and speed curves")
+    parser.add_argument('--rebuild', action='store_true', help="discard the cached curves and envelopes first")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        for path in [ENVELOPES_PATH, STATE_PATH, *CURVES_DIR.glob('*.npz')]:
+            if path.exists():
+                path.unlink()
+
+    consolidate()
+    state, all_time = update_curves()
+    summary = mean_max_summary(state, all_time)
+    OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(OUTPUT_PATH, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Mean-maximal curves exported to {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
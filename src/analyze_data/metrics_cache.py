@@ -0,0 +1,64 @@
+import hashlib
+import inspect
+import json
+import os
+from pathlib import Path
+
+from src.export_data.strava_streams import legacy_streams_paths, streams_path
+
+# Derived metrics of every analysed activity, keyed by activity_id and a fingerprint of its files.
+# The whole cache is dropped when the analysis code or the zone config changes.
+CACHE_PATH = Path("src/analyze_data/state/derived_metrics.json")
+
+
+def cache_version(config, *modules):
+    """Hash of the zone config and the source of the modules computing the metrics"""
+    digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode())
+    for module in modules:
+        digest.update(inspect.getsource(module).encode())
+    return digest.hexdigest()
+
+
+def activity_fingerprint(detailed_dir, activity_id):
+    """Name, mtime and size of an activity's detail and stream files, from stat alone"""
+    paths = [os.path.join(detailed_dir, f"activity_{activity_id}.json"),
+             streams_path(detailed_dir, activity_id), *legacy_streams_paths(detailed_dir, activity_id)]
+    fingerprint = []
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            fingerprint.append([os.path.basename(path), stat.st_mtime_ns, stat.st_size])
+    return fingerprint
+
+
+def load_cache(version, path=CACHE_PATH):
+    """Cached entries by activity_id, empty if the cache was written by another version"""
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        cache = json.load(f)
+    if cache.get('version') != version:
+        return {}
+    return cache['activities']
+
+
+def save_cache(version, activities, path=CACHE_PATH):
+    """Atomically replace the cache"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({'version': version, 'activities': activities}, f)
+    os.replace(tmp_path, path)
+
+
+def cached_metrics(activities, fingerprints):
+    """Split activity IDs into cache hits, {activity_id: metrics}, and the IDs that need computing"""
+    hits = {}
+    misses = []
+    for activity_id, fingerprint in fingerprints.items():
+        entry = activities.get(activity_id)
+        if entry is not None and entry['fingerprint'] == fingerprint:
+            hits[activity_id] = entry['metrics']
+        else:
+            misses.append(activity_id)
+    return hits, misses
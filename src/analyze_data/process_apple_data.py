@@ -1,195 +1,407 @@
-import os 
+import os
+import argparse
 import polars as pl
 from icecream import ic
 import json
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+
+from src.export_data.apple_store import scan_records
+
+# Run from the repository root:
+#   python -m src.analyze_data.process_apple_data                 # single night
+#   python -m src.analyze_data.process_apple_data --batch         # every night in the store
+DATA_DIR = Path("src/analyze_data/data")
+
+SLEEP = "HKCategoryTypeIdentifierSleepAnalysis"
+HRV = "HKQuantityTypeIdentifierHeartRateVariabilitySDNN"
+HEART_RATE = "HKQuantityTypeIdentifierHeartRate"
+
+# A sleep night runs from noon to noon (UTC) and is keyed by the date it starts on
+NIGHT_START_HOUR = 12
+DEFAULT_NIGHT = date(2025, 3, 20)
+
+SLEEP_STAGE_LABELS = {
+    "HKCategoryValueSleepAnalysisAsleepREM": "REM sleep",
+    "HKCategoryValueSleepAnalysisAsleepDeep": "Deep sleep",
+    "HKCategoryValueSleepAnalysisAsleepCore": "Asleep",
+    "HKCategoryValueSleepAnalysisAwake": "Awake",
+}
+HR_PERCENTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+
+def months_between(start, end):
+    """Return the YYYY-MM store partitions covering the dates start..end"""
+    months = []
+    current = start.replace(day=1)
+    while current <= end:
+        months.append(current.strftime("%Y-%m"))
+        current = (current + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def scan_sleep_records(start=None, end=None):
+    """Lazily scan the sleep, HR and HRV records whose start falls within start..end.
+
+    The record type, source and date window predicates and the column
+    selection are pushed down to the Parquet scan, and only the month
+    partitions overlapping the window are opened.
+    """
+    months = months_between(start.date(), end.date()) if start and end else None
+    predicate = pl.col("sourceName") != "AutoSleep"
+    if start is not None:
+        predicate &= pl.col("start_date") >= start
+    if end is not None:
+        predicate &= pl.col("start_date") <= end
+
+    return (
+        scan_records(record_types=[SLEEP, HRV, HEART_RATE], months=months)
+        .filter(predicate)
+        .select(["record_type", "start_date", "end_date", "value", "category_value"])
+    )
+
+
+def during_sleep(records, envelopes, record_type, on=None):
+    """Lazy branch of ``record_type`` samples overlapping their night's sleep window"""
+    branch = records.filter(pl.col("record_type") == record_type)
+    branch = branch.join(envelopes, on=on) if on else branch.join(envelopes, how="cross")
+    return branch.filter(
+        (pl.col("end_date") >= pl.col("sleep_start_time"))
+        &
+        (pl.col("start_date") <= pl.col("sleep_end_time"))
+    )
+
+
+def sleep_stage_label():
+    """Expression replacing raw sleep classification values with readable labels"""
+    return pl.col("category_value").cast(pl.String).replace(SLEEP_STAGE_LABELS)
 
-os.system("clear")
-# Configure polars to display up to 100 rows in terminal output
-pl.Config.set_tbl_rows(100)
 
-df = pl.read_csv("src/export_data/data/sleep_data.csv")
-df = df.drop(["startDate", "endDate", "device", "creationDate"])
-df = df.filter(pl.col("sourceName") != "AutoSleep")
-df = df.drop(["sourceName"])
+def assign_sleep_stages(samples, sleep, by=None):
+    """Tag each sample with the REM/Deep/Core/Awake interval it falls in.
 
-df = df.with_columns(
-    pl.col("start_date").str.strptime(pl.Datetime, format="%Y-%m-%d %H:%M:%S %z").alias("start_date"),
-    pl.col("end_date").str.strptime(pl.Datetime, format="%Y-%m-%d %H:%M:%S %z").alias("end_date"),
-)
+    Uses a sorted as-of join: every sample is matched to the latest stage
+    starting at or before it, and kept only if it falls before that stage
+    ends. This is O(n log n) instead of comparing every sample to every stage.
+    """
+    stages = sleep.filter(
+        pl.col("category_value").cast(pl.String).is_in(list(SLEEP_STAGE_LABELS))
+    ).select(
+        *([by] if by else []),
+        pl.col("start_date").alias("stage_start"),
+        pl.col("end_date").alias("stage_end"),
+        sleep_stage_label().alias("sleep_stage"),
+    ).sort("stage_start")
 
-df = df.filter(pl.col("start_date").dt.date() == pl.datetime(2025, 3, 21, time_zone="UTC").dt.date())
+    # Both sides are sorted globally, hence within every `by` group too
+    return samples.sort("start_date").join_asof(
+        stages, left_on="start_date", right_on="stage_start", by=by, strategy="backward",
+        check_sortedness=False,
+    ).with_columns(
+        pl.when(pl.col("start_date") < pl.col("stage_end")).then(pl.col("sleep_stage")).alias("sleep_stage")
+    ).drop(["stage_start", "stage_end"])
 
-df = df.filter(
-    (pl.col("start_date") >= pl.datetime(2025, 3, 20, 12, 0, 0, time_zone="UTC"))
-    & 
-    (pl.col("start_date") <= pl.datetime(2025, 3, 21, 12, 0, 0, time_zone="UTC"))
+
+def stage_stats(samples, prefix, by=()):
+    """Per sleep stage statistics of tagged samples, samples outside any stage are left out"""
+    return samples.filter(pl.col("sleep_stage").is_not_null()).group_by(*by, "sleep_stage").agg(
+        pl.count("value").alias(f"num_{prefix}_measurements"),
+        pl.mean("value").alias(f"avg_{prefix}"),
+        pl.min("value").alias(f"min_{prefix}"),
+        pl.max("value").alias(f"max_{prefix}"),
+        pl.std("value").alias(f"std_{prefix}"),
+    ).sort(*by, "sleep_stage")
+
+
+def analyze_night(records):
+    """Build the LLM heart rate analysis, sleep stage durations and HRV data of a single night.
+
+    ``records`` is the lazy scan of the night's window. The sleep, HR and HRV
+    branches are collected together so they share that one scan.
+    """
+    sleep = records.filter(pl.col("record_type") == SLEEP)
+    envelope = sleep.select(
+        pl.col("start_date").min().alias("sleep_start_time"),
+        pl.col("end_date").max().alias("sleep_end_time"),
     )
 
-sleep_start_time = df.filter(pl.col("record_type") == "HKCategoryTypeIdentifierSleepAnalysis").select(pl.col("start_date")).min()[0]
-sleep_end_time = df.filter(pl.col("record_type") == "HKCategoryTypeIdentifierSleepAnalysis").select(pl.col("end_date")).max()[0]
-
-### HEART RATE (bpm) DATA
-heart_rate_data = df.filter(
-    (pl.col("record_type") == "HKQuantityTypeIdentifierHeartRate")
-    &
-    (pl.col("end_date") >= pl.lit(sleep_start_time))
-    &
-    (pl.col("start_date") <= pl.lit(sleep_end_time))
-)
-heart_rate_data = heart_rate_data.drop(["end_date", "type"]).rename({"start_date": "time_when_measured"})
-heart_rate_data = heart_rate_data.with_columns(
-    pl.lit('Heart Rate (bpm)').alias('record_type'), 
-    pl.col("time_when_measured").dt.hour().alias("hour_when_measured"), 
-    pl.col("value").cast(pl.Float64).alias("value")
+    sleep_classification_data, heart_rate_data, hrv_data = pl.collect_all([
+        sleep,
+        assign_sleep_stages(during_sleep(records, envelope, HEART_RATE), sleep),
+        assign_sleep_stages(during_sleep(records, envelope, HRV), sleep),
+    ])
+    sleep_start_time = sleep_classification_data["start_date"].min()
+    sleep_end_time = sleep_classification_data["end_date"].max()
+
+    ### HEART RATE (bpm) DATA
+    heart_rate_data = heart_rate_data.drop(["end_date", "category_value", "sleep_start_time", "sleep_end_time"])
+    heart_rate_data = heart_rate_data.rename({"start_date": "time_when_measured"})
+    heart_rate_data = heart_rate_data.with_columns(
+        pl.lit('Heart Rate (bpm)').alias('record_type'),
+        pl.col("time_when_measured").dt.hour().alias("hour_when_measured"),
+        )
+
+    # Create a comprehensive heart rate analysis dataframe for LLM input
+    heart_rate_analysis = {
+        # Basic statistics
+        "basic_stats": heart_rate_data.select([
+            pl.min("value").alias("min_heart_rate"),
+            pl.max("value").alias("max_heart_rate"),
+            pl.mean("value").alias("avg_heart_rate"),
+            pl.median("value").alias("median_heart_rate"),
+            pl.std("value").alias("std_heart_rate"),
+            pl.count("value").alias("num_measurements")
+        ]),
+
+        # Percentiles for distribution analysis
+        "percentiles": heart_rate_data.select([
+            pl.col("value").quantile(0.05).alias("5th_percentile"),
+            pl.col("value").quantile(0.25).alias("25th_percentile"),
+            pl.col("value").quantile(0.5).alias("50th_percentile"),
+            pl.col("value").quantile(0.75).alias("75th_percentile"),
+            pl.col("value").quantile(0.95).alias("95th_percentile")
+        ]),
+
+        # Hourly distribution
+        "hourly_distribution": heart_rate_data.group_by("hour_when_measured").agg([
+            pl.count("value").alias("count"),
+            pl.mean("value").alias("avg_hr"),
+            pl.min("value").alias("min_hr"),
+            pl.max("value").alias("max_hr"),
+            pl.std("value").alias("std_hr")
+        ]).sort("hour_when_measured"),
+
+        # Heart rate in each sleep stage
+        "by_sleep_stage": stage_stats(heart_rate_data, "heart_rate"),
+
+        # Time series data (for trend analysis)
+        "time_series": heart_rate_data.select(["time_when_measured", "value"])
+            .sort("time_when_measured"),
+
+        "sleep_metadata": pl.DataFrame({
+            "sleep_start_time": [sleep_start_time],
+            "sleep_end_time": [sleep_end_time],
+            # "total_sleep_duration_hours": [(sleep_end_time - sleep_start_time).dt.total_seconds() / 3600]
+        })
+    }
+
+    # Calculate additional metrics
+    heart_rate_analysis["variability"] = pl.DataFrame({
+        "heart_rate_range": [heart_rate_analysis["basic_stats"].item(0, "max_heart_rate") -
+                             heart_rate_analysis["basic_stats"].item(0, "min_heart_rate")],
+        "coefficient_of_variation": [heart_rate_analysis["basic_stats"].item(0, "std_heart_rate") /
+                                    heart_rate_analysis["basic_stats"].item(0, "avg_heart_rate") * 100]
+    })
+
+    # Calculate rate of change metrics
+    if len(heart_rate_analysis["time_series"]) > 1:
+        time_series_df = heart_rate_analysis["time_series"]
+        time_series_df = time_series_df.with_columns([
+            pl.col("value").diff().alias("hr_change"),
+            (pl.col("time_when_measured").diff().dt.total_seconds() / 60).alias("time_diff_minutes")
+        ]).filter(pl.col("hr_change").is_not_null())
+
+        # Calculate rate of change per minute
+        time_series_df = time_series_df.with_columns([
+            (pl.col("hr_change") / pl.col("time_diff_minutes")).alias("hr_change_per_minute")
+        ])
+
+        heart_rate_analysis["rate_of_change"] = time_series_df.select([
+            pl.mean("hr_change_per_minute").alias("avg_hr_change_per_minute"),
+            pl.max("hr_change_per_minute").alias("max_hr_increase_per_minute"),
+            pl.min("hr_change_per_minute").alias("max_hr_decrease_per_minute")
+        ])
+
+    ### HRV DATA
+    hrv_data = hrv_data.drop(["category_value", "sleep_start_time", "sleep_end_time"])
+    hrv_data = hrv_data.with_columns(pl.lit('Heart Rate Variability SDNN').alias('record_type'))
+
+    ### Sleep Classification Data
+    # Replace sleep classification values with more readable labels
+    sleep_classification_data = sleep_classification_data.with_columns(sleep_stage_label().alias("value"))
+
+    # Calculate duration by subtracting end_date from start_date
+    sleep_classification_data = sleep_classification_data.with_columns(
+        (pl.col("end_date").dt.timestamp() - pl.col("start_date").dt.timestamp()).alias("duration")
     )
 
-# Create a comprehensive heart rate analysis dataframe for LLM input
-heart_rate_analysis = {
-    # Basic statistics
-    "basic_stats": heart_rate_data.select([
+    # Convert duration from seconds to minutes for better readability
+    sleep_classification_data = sleep_classification_data.with_columns(
+        (pl.col("duration") / 60 / 60 / 1000 / 1000).alias("duration_hours")
+    )
+
+    # Group by sleep stage and sum the duration in minutes
+    sleep_duration_by_stage = sleep_classification_data.group_by("value").agg(
+        pl.sum("duration_hours").alias("total_duration_hours")
+    ).rename({"value": "sleep_stage"})
+
+    #########################
+    # Convert to a single dataframe for LLM input
+    heart_rate_llm_input = {
+        "heart_rate_analysis": heart_rate_analysis,
+        "hrv_by_sleep_stage": stage_stats(hrv_data, "hrv_sdnn"),
+        "analysis_date": sleep_start_time,
+        "data_source": "Apple Health"
+    }
+
+    # Print summary of the analysis data
+    print("Heart Rate Analysis Data Structure Created for LLM Input")
+    print(f"Number of components: {len(heart_rate_analysis)}")
+    print(f"Basic stats shape: {heart_rate_analysis['basic_stats'].shape}")
+    print(f"Time series data points: {heart_rate_analysis['time_series'].shape[0]}")
+
+    return heart_rate_llm_input, sleep_duration_by_stage, hrv_data
+
+
+def export_night(heart_rate_llm_input, sleep_duration_by_stage, hrv_data, data_dir=DATA_DIR):
+    """Export the single night analysis to files for LLM processing"""
+    # Create data directory if it doesn't exist
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    # Export heart rate data
+    heart_rate_file = data_dir / "sleep_data_heart_rate.json"
+    with open(heart_rate_file, "w") as f:
+        json.dump(heart_rate_llm_input, f, default=str)
+    print(f"Heart rate data exported to {heart_rate_file}")
+
+    # Export sleep duration by stage data
+    sleep_duration_file = data_dir / "sleep_data_duration_by_stage.csv"
+    sleep_duration_by_stage.write_csv(sleep_duration_file)
+    print(f"Sleep duration data exported to {sleep_duration_file}")
+
+    # Export HRV data
+    hrv_file = data_dir / "sleep_data_hrv.csv"
+    hrv_data.write_csv(hrv_file)
+    print(f"HRV data exported to {hrv_file}")
+
+
+def night_key(column="start_date"):
+    """Expression assigning a timestamp to the noon-to-noon sleep night it belongs to"""
+    return (pl.col(column) - pl.duration(hours=NIGHT_START_HOUR)).dt.date().alias("night")
+
+
+def analyze_nights(records):
+    """Compute the sleep analysis of every night in ``records`` in one grouped pass.
+
+    ``records`` is a lazy scan. Every branch below stays lazy and everything is
+    collected at once, so the HR, HRV and sleep branches share a single scan.
+    Returns one row per night (sleep window, heart rate stats and percentiles,
+    HRV stats and stage durations), the hourly heart rate distribution keyed
+    by night and hour, and the HR/HRV stats per night and sleep stage.
+    """
+    records = records.with_columns(night_key())
+
+    # Sleep window of each night
+    sleep = records.filter(pl.col("record_type") == SLEEP)
+    envelopes = sleep.group_by("night").agg(
+        pl.col("start_date").min().alias("sleep_start_time"),
+        pl.col("end_date").max().alias("sleep_end_time"),
+    )
+
+    heart_rate = assign_sleep_stages(during_sleep(records, envelopes, HEART_RATE, on="night"), sleep, by="night")
+    hrv = assign_sleep_stages(during_sleep(records, envelopes, HRV, on="night"), sleep, by="night")
+
+    hr_stats = heart_rate.group_by("night").agg(
         pl.min("value").alias("min_heart_rate"),
         pl.max("value").alias("max_heart_rate"),
         pl.mean("value").alias("avg_heart_rate"),
         pl.median("value").alias("median_heart_rate"),
         pl.std("value").alias("std_heart_rate"),
-        pl.count("value").alias("num_measurements")
-    ]),
-    
-    # Percentiles for distribution analysis
-    "percentiles": heart_rate_data.select([
-        pl.col("value").quantile(0.05).alias("5th_percentile"),
-        pl.col("value").quantile(0.25).alias("25th_percentile"),
-        pl.col("value").quantile(0.5).alias("50th_percentile"),
-        pl.col("value").quantile(0.75).alias("75th_percentile"),
-        pl.col("value").quantile(0.95).alias("95th_percentile")
-    ]),
-    
-    # Hourly distribution
-    "hourly_distribution": heart_rate_data.group_by("hour_when_measured").agg([
+        pl.count("value").alias("num_measurements"),
+        *[pl.col("value").quantile(q).alias(f"hr_{int(q * 100)}th_percentile") for q in HR_PERCENTILES],
+    ).with_columns(
+        (pl.col("max_heart_rate") - pl.col("min_heart_rate")).alias("heart_rate_range"),
+        (pl.col("std_heart_rate") / pl.col("avg_heart_rate") * 100).alias("coefficient_of_variation"),
+    )
+
+    hourly_distribution = heart_rate.group_by(
+        "night", pl.col("start_date").dt.hour().alias("hour_when_measured")
+    ).agg(
         pl.count("value").alias("count"),
         pl.mean("value").alias("avg_hr"),
         pl.min("value").alias("min_hr"),
         pl.max("value").alias("max_hr"),
-        pl.std("value").alias("std_hr")
-    ]).sort("hour_when_measured"),
-    
-    # Time series data (for trend analysis)
-    "time_series": heart_rate_data.select(["time_when_measured", "value"])
-        .sort("time_when_measured"),
-    
-    "sleep_metadata": pl.DataFrame({
-        "sleep_start_time": [sleep_start_time],
-        "sleep_end_time": [sleep_end_time],
-        # "total_sleep_duration_hours": [(sleep_end_time - sleep_start_time).dt.total_seconds() / 3600]
-    })
-}
+        pl.std("value").alias("std_hr"),
+    ).sort("night", "hour_when_measured")
 
-# Calculate additional metrics
-heart_rate_analysis["variability"] = pl.DataFrame({
-    "heart_rate_range": [heart_rate_analysis["basic_stats"].item(0, "max_heart_rate") - 
-                         heart_rate_analysis["basic_stats"].item(0, "min_heart_rate")],
-    "coefficient_of_variation": [heart_rate_analysis["basic_stats"].item(0, "std_heart_rate") / 
-                                heart_rate_analysis["basic_stats"].item(0, "avg_heart_rate") * 100]
-})
-
-# Calculate rate of change metrics
-if len(heart_rate_analysis["time_series"]) > 1:
-    time_series_df = heart_rate_analysis["time_series"]
-    time_series_df = time_series_df.with_columns([
-        pl.col("value").diff().alias("hr_change"),
-        (pl.col("time_when_measured").diff().dt.total_seconds() / 60).alias("time_diff_minutes")
-    ]).filter(pl.col("hr_change").is_not_null())
-    
-    # Calculate rate of change per minute
-    time_series_df = time_series_df.with_columns([
-        (pl.col("hr_change") / pl.col("time_diff_minutes")).alias("hr_change_per_minute")
-    ])
-    
-    heart_rate_analysis["rate_of_change"] = time_series_df.select([
-        pl.mean("hr_change_per_minute").alias("avg_hr_change_per_minute"),
-        pl.max("hr_change_per_minute").alias("max_hr_increase_per_minute"),
-        pl.min("hr_change_per_minute").alias("max_hr_decrease_per_minute")
-    ])
+    hrv_stats = hrv.group_by("night").agg(
+        pl.min("value").alias("min_hrv_sdnn"),
+        pl.max("value").alias("max_hrv_sdnn"),
+        pl.mean("value").alias("avg_hrv_sdnn"),
+        pl.count("value").alias("num_hrv_measurements"),
+    )
 
+    # Hours spent in each sleep stage, one column per stage
+    stages = sleep.with_columns(
+        sleep_stage_label().alias("sleep_stage"),
+        ((pl.col("end_date") - pl.col("start_date")).dt.total_seconds() / 3600).alias("duration_hours"),
+    ).group_by("night").agg(
+        pl.col("duration_hours").filter(pl.col("sleep_stage") == label).sum()
+        .alias(f"{label.lower().replace(' ', '_')}_hours")
+        for label in SLEEP_STAGE_LABELS.values()
+    )
 
+    nights = (
+        envelopes
+        .join(hr_stats, on="night", how="left")
+        .join(hrv_stats, on="night", how="left")
+        .join(stages, on="night", how="left")
+        .sort("night")
+    )
+    by_stage = stage_stats(heart_rate, "heart_rate", by=["night"]).join(
+        stage_stats(hrv, "hrv_sdnn", by=["night"]), on=["night", "sleep_stage"], how="full", coalesce=True
+    ).sort("night", "sleep_stage")
 
-### HRV DATA
-hrv_data = df.filter(
-    (pl.col("record_type") == "HKQuantityTypeIdentifierHeartRateVariabilitySDNN")
-    &
-    (pl.col("end_date") >= pl.lit(sleep_start_time))
-    &
-    (pl.col("start_date") <= pl.lit(sleep_end_time))
-)
-hrv_data = hrv_data.drop(["type"])
-hrv_data = hrv_data.with_columns(pl.lit('Heart Rate Variability SDNN').alias('record_type'))
-
-### Sleep Classification Data
-sleep_classification_data = df.filter(pl.col("record_type") == "HKCategoryTypeIdentifierSleepAnalysis")
-
-# Replace sleep classification values with more readable labels
-sleep_classification_data = sleep_classification_data.with_columns(
-    pl.when(pl.col("value") == "HKCategoryValueSleepAnalysisAsleepREM")
-    .then(pl.lit("REM sleep"))
-    .when(pl.col("value") == "HKCategoryValueSleepAnalysisAsleepDeep")
-    .then(pl.lit("Deep sleep"))
-    .when(pl.col("value") == "HKCategoryValueSleepAnalysisAsleepCore")
-    .then(pl.lit("Asleep"))
-    .when(pl.col("value") == "HKCategoryValueSleepAnalysisAwake")
-    .then(pl.lit("Awake"))
-    .otherwise(pl.col("value"))
-    .alias("value")
-)
-
-# Calculate duration by subtracting end_date from start_date
-sleep_classification_data = sleep_classification_data.with_columns(
-    (pl.col("end_date").dt.timestamp() - pl.col("start_date").dt.timestamp()).alias("duration")
-)
-
-# Convert duration from seconds to minutes for better readability
-sleep_classification_data = sleep_classification_data.with_columns(
-    (pl.col("duration") / 60 / 60 / 1000 / 1000).alias("duration_hours")
-)
-
-# Group by sleep stage and sum the duration in minutes
-sleep_duration_by_stage = sleep_classification_data.group_by("value").agg(
-    pl.sum("duration_hours").alias("total_duration_hours")
-).rename({"value": "sleep_stage"})
-
-#########################
-# Convert to a single dataframe for LLM input
-heart_rate_llm_input = {
-    "heart_rate_analysis": heart_rate_analysis,
-    "analysis_date": sleep_start_time,
-    "data_source": "Apple Health"
-}
+    return pl.collect_all([nights, hourly_distribution, by_stage])
 
-# Print summary of the analysis data
-print("Heart Rate Analysis Data Structure Created for LLM Input")
-print(f"Number of components: {len(heart_rate_analysis)}")
-print(f"Basic stats shape: {heart_rate_analysis['basic_stats'].shape}")
-print(f"Time series data points: {heart_rate_analysis['time_series'].shape[0]}")
 
-# Export data to files for LLM processing
-import os
-from pathlib import Path
+def export_nights(nights, hourly_distribution, by_stage, data_dir=DATA_DIR):
+    """Export the batch analysis, one row per night"""
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    nights_file = data_dir / "sleep_nights.csv"
+    nights.write_csv(nights_file)
+    print(f"Nightly sleep analysis for {len(nights)} nights exported to {nights_file}")
+
+    hourly_file = data_dir / "sleep_nights_hourly_heart_rate.csv"
+    hourly_distribution.write_csv(hourly_file)
+    print(f"Hourly heart rate distribution exported to {hourly_file}")
+
+    by_stage_file = data_dir / "sleep_nights_by_stage.csv"
+    by_stage.write_csv(by_stage_file)
+    print(f"Heart rate and HRV by sleep stage exported to {by_stage_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse Apple Health sleep, heart rate and HRV data")
+    parser.add_argument('--batch', action='store_true', help="analyse every night in one grouped pass")
+    parser.add_argument('--night', type=date.fromisoformat, default=DEFAULT_NIGHT,
+                        help="night to analyse in single night mode (date the night starts on)")
+    parser.add_argument('--from', dest='start', type=date.fromisoformat, help="first night in batch mode")
+    parser.add_argument('--to', dest='end', type=date.fromisoformat, help="last night in batch mode")
+    args = parser.parse_args()
+
+    os.system("clear")
+    # Configure polars to display up to 100 rows in terminal output
+    pl.Config.set_tbl_rows(100)
+
+    if args.batch:
+        # Nights start at noon, so the window runs from the first night's noon to the noon after the last
+        start = datetime.combine(args.start, time(NIGHT_START_HOUR), tzinfo=timezone.utc) if args.start else None
+        end = None
+        if args.end:
+            # The window end is inclusive, stop just before the noon that starts the next night
+            end = datetime.combine(args.end + timedelta(days=1), time(NIGHT_START_HOUR), tzinfo=timezone.utc)
+            end -= timedelta(microseconds=1)
+        nights, hourly_distribution, by_stage = analyze_nights(scan_sleep_records(start, end))
+        ic(nights)
+        export_nights(nights, hourly_distribution, by_stage)
+    else:
+        # Same window as before: records starting between midnight and noon after the night starts
+        window_end = datetime.combine(args.night + timedelta(days=1), time(NIGHT_START_HOUR), tzinfo=timezone.utc)
+        window_start = window_end.replace(hour=0)
+        export_night(*analyze_night(scan_sleep_records(window_start, window_end)))
+
 
-# Create data directory if it doesn't exist
-data_dir = Path("src/analyze_data/data")
-data_dir.mkdir(parents=True, exist_ok=True)
-
-# Export heart rate data
-heart_rate_file = data_dir / "sleep_data_heart_rate.json"
-with open(heart_rate_file, "w") as f:
-    json.dump(heart_rate_llm_input, f, default=str)
-print(f"Heart rate data exported to {heart_rate_file}")
-
-# Export sleep duration by stage data
-sleep_duration_file = data_dir / "sleep_data_duration_by_stage.csv"
-sleep_duration_by_stage.write_csv(sleep_duration_file)
-print(f"Sleep duration data exported to {sleep_duration_file}")
-
-# Export HRV data
-hrv_file = data_dir / "sleep_data_hrv.csv"
-hrv_data.write_csv(hrv_file)
-print(f"HRV data exported to {hrv_file}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import json
+import math
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+
+import polars as pl
+
+from src.analyze_data.process_apple_data import DATA_DIR, NIGHT_START_HOUR, analyze_nights, scan_sleep_records
+
+# Run from the repository root:
+#   python -m src.analyze_data.sleep_baselines backfill   # build the state once over every night
+#   python -m src.analyze_data.sleep_baselines update     # fold in the nights added since
+STATE_PATH = Path("src/analyze_data/state/sleep_baselines.json")
+SUMMARY_PATH = DATA_DIR / "sleep_baselines.json"
+HISTORY_PATH = DATA_DIR / "sleep_baselines_history.csv"
+
+# Baseline metric -> column of the nightly sleep analysis it is taken from
+METRICS = {
+    "hrv_sdnn": "avg_hrv_sdnn",
+    "resting_hr": "min_heart_rate",
+}
+# Baseline windows in days, a night is compared to the nights before it
+WINDOWS = (7, 28)
+
+
+def empty_state():
+    """State with no nights folded in yet"""
+    return {"last_night": None, "history": {metric: [] for metric in METRICS}}
+
+
+def load_state(path=STATE_PATH):
+    """Load the materialised baseline state, or an empty one"""
+    if not path.exists():
+        return empty_state()
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_PATH):
+    """Atomically write the baseline state"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _baseline(values):
+    """Mean and sample standard deviation of a window, None when not enough nights"""
+    if not values:
+        return None, None
+    mean = sum(values) / len(values)
+    if len(values) < 2:
+        return mean, None
+    return mean, math.sqrt(sum((v - mean) ** 2 for v in values) / (len(values) - 1))
+
+
+def _z_score(value, mean, std):
+    if value is None or mean is None or not std:
+        return None
+    return (value - mean) / std
+
+
+def update_state(state, night, values):
+    """Fold one new night into the state and return its baselines and z-scores.
+
+    Only the last max(WINDOWS) nights are kept per metric, so the work per
+    night is constant no matter how long the history is.
+    """
+    summary = {"night": night.isoformat()}
+    for metric in METRICS:
+        history = state["history"][metric]
+        value = values.get(metric)
+        metric_summary = {"value": value}
+        for window in WINDOWS:
+            start = (night - timedelta(days=window)).isoformat()
+            window_values = [v for d, v in history if start <= d < summary["night"]]
+            mean, std = _baseline(window_values)
+            metric_summary[f"baseline_{window}d_mean"] = mean
+            metric_summary[f"baseline_{window}d_std"] = std
+            metric_summary[f"z_{window}d"] = _z_score(value, mean, std)
+        summary[metric] = metric_summary
+
+        if value is not None:
+            history.append([summary["night"], value])
+        # Evict nights that can no longer fall into any window
+        oldest = (night - timedelta(days=max(WINDOWS))).isoformat()
+        state["history"][metric] = [[d, v] for d, v in history if d >= oldest]
+
+    state["last_night"] = summary["night"]
+    return summary
+
+
+def nightly_metrics(nights):
+    """Select the baseline metrics from the nightly sleep analysis"""
+    return nights.select(
+        "night", *[pl.col(column).alias(metric) for metric, column in METRICS.items()]
+    ).sort("night")
+
+
+def backfill(nights):
+    """Compute baselines and z-scores for every night at once and build the state.
+
+    Windows are calendar based and exclude the night itself, matching
+    update_state().
+    """
+    metrics = nightly_metrics(nights)
+    history = metrics.with_columns(
+        expression
+        for metric in METRICS
+        for window in WINDOWS
+        for expression in (
+            pl.col(metric).rolling_mean_by("night", window_size=f"{window}d", closed="left")
+            .alias(f"{metric}_baseline_{window}d_mean"),
+            pl.col(metric).rolling_std_by("night", window_size=f"{window}d", closed="left")
+            .alias(f"{metric}_baseline_{window}d_std"),
+        )
+    ).with_columns(
+        # A window of identical nights has no spread, its z-score is null as in _z_score()
+        pl.when(pl.col(f"{metric}_baseline_{window}d_std") > 0)
+        .then((pl.col(metric) - pl.col(f"{metric}_baseline_{window}d_mean"))
+              / pl.col(f"{metric}_baseline_{window}d_std"))
+        .alias(f"{metric}_z_{window}d")
+        for metric in METRICS
+        for window in WINDOWS
+    )
+
+    # Seed the incremental state with the nights still inside the longest window
+    state = empty_state()
+    if not metrics.is_empty():
+        last_night = metrics["night"].max()
+        recent = metrics.filter(pl.col("night") > last_night - timedelta(days=max(WINDOWS)))
+        for metric in METRICS:
+            state["history"][metric] = [
+                [night.isoformat(), value]
+                for night, value in recent.select("night", metric).drop_nulls().iter_rows()
+            ]
+        state["last_night"] = last_night.isoformat()
+
+    return state, history
+
+
+def latest_summary(history):
+    """Summary of the last night of a backfilled history, same layout as update_state()"""
+    row = history.row(-1, named=True)
+    summary = {"night": row["night"].isoformat()}
+    for metric in METRICS:
+        summary[metric] = {"value": row[metric]}
+        for window in WINDOWS:
+            for key in (f"baseline_{window}d_mean", f"baseline_{window}d_std", f"z_{window}d"):
+                value = row[f"{metric}_{key}"]
+                summary[metric][key] = None if value is None or math.isnan(value) else value
+    return summary
+
+
+def write_summary(summary, path=SUMMARY_PATH):
+    """Write the latest night's baselines for the LLM prompt"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"Sleep baselines for {summary['night']} exported to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain rolling HRV and resting heart rate baselines")
+    parser.add_argument("command", choices=["backfill", "update"])
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        nights, _, _ = analyze_nights(scan_sleep_records())
+        state, history = backfill(nights)
+        if state["last_night"] is None:
+            print("No nights found in the Apple Health store")
+            return
+        save_state(state)
+        history.write_csv(HISTORY_PATH)
+        print(f"Backfilled baselines over {len(history)} nights, history exported to {HISTORY_PATH}")
+        write_summary(latest_summary(history))
+        return
+
+    state = load_state()
+    if state["last_night"] is None:
+        print("No baseline state yet, run the backfill command first")
+        return
+
+    # Only scan the records of nights after the last one folded into the state
+    first_night = date.fromisoformat(state["last_night"]) + timedelta(days=1)
+    start = datetime.combine(first_night, time(NIGHT_START_HOUR), tzinfo=timezone.utc)
+    nights, _, _ = analyze_nights(scan_sleep_records(start=start))
+
+    summary = None
+    for row in nightly_metrics(nights).iter_rows(named=True):
+        summary = update_state(state, row["night"], row)
+
+    if summary is None:
+        print(f"No new nights since {state['last_night']}")
+        return
+    save_state(state)
+    write_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import polars as pl
+
+from src.analyze_data.rolling_metrics import power_metrics, resample_1hz
+from src.export_data.stream_store import consolidate, read_index, scan_streams
+from src.export_data.zones import calculate_hr_zones, load_zone_config, threshold_on, thresholds_for, zone_config_version
+
+# Run from the repository root: python -m src.analyze_data.training_load [--rebuild]
+# Chronic and acute training load (CTL/ATL) and their balance (TSB) over the full history.
+# Per-activity stress scores and the daily series are kept as state, so a new
+# activity only recomputes the days from its own date on. The state is dropped
+# when the zone config changes, its scores used the old FTP and heart rates.
+STATE_DIR = Path("src/analyze_data/state/training_load")
+STATE_PATH = STATE_DIR / "state.json"
+DAILY_PATH = STATE_DIR / "daily.parquet"
+OUTPUT_PATH = Path("src/analyze_data/data/training_load.json")
+
+# Time constants of the exponentially weighted loads, in days
+CTL_DAYS = 42
+ATL_DAYS = 7
+# Days of the daily series reported to the LLM
+REPORT_DAYS = 42
+# Resting heart rate for TRIMP when the zone config has no hr_rest history
+DEFAULT_HR_REST = 60
+
+DAILY_SCHEMA = {'date': pl.Date, 'stress': pl.Float64, 'ctl': pl.Float64, 'atl': pl.Float64, 'tsb': pl.Float64}
+
+
+def _hr_thresholds(config, start_date):
+    """(resting HR, HR max, threshold HR) that applied when an activity started"""
+    hr_max, _ = thresholds_for(config, start_date)
+    hr_rest = threshold_on(config.get('hr_rest', [{'from': '2000-01-01', 'value': DEFAULT_HR_REST}]), start_date[:10])
+    threshold_hr = calculate_hr_zones(hr_max)['Zone 4 (Threshold)'][0]
+    return hr_rest, hr_max, threshold_hr
+
+
+def _trimp(hr_reserve):
+    """Banister TRIMP per minute of a heart rate reserve fraction"""
+    return hr_reserve * 0.64 * (1.92 * hr_reserve).exp()
+
+
+def heart_rate_load(grid, thresholds):
+    """Banister TRIMP of every activity with heart rate on the 1 Hz grid, and its TSS equivalent.
+
+    thresholds is a frame of activity_id, hr_rest, hr_max and threshold_hr.
+    The TSS equivalent (hrTSS) scales TRIMP so that an hour at threshold heart
+    rate scores 100, like an hour at FTP does for TSS. Returns {activity_id:
+    (trimp, hr_tss)}.
+    """
+    hr_reserve = ((pl.col('heartrate') - pl.col('hr_rest')) / (pl.col('hr_max') - pl.col('hr_rest'))).clip(0, 1)
+    threshold_reserve = (pl.col('threshold_hr') - pl.col('hr_rest')) / (pl.col('hr_max') - pl.col('hr_rest'))
+    loads = (
+        grid.lazy()
+        .filter(pl.col('heartrate').is_not_null())
+        .join(thresholds.lazy(), on='activity_id')
+        .group_by('activity_id')
+        .agg(
+            (_trimp(hr_reserve).sum() / 60).alias('trimp'),
+            (_trimp(threshold_reserve.first()) * 60).alias('threshold_trimp'),
+        )
+        .collect()
+    )
+    return {
+        str(row['activity_id']): (row['trimp'], row['trimp'] / row['threshold_trimp'] * 100)
+        for row in loads.iter_rows(named=True)
+    }
+
+
+def activity_stress(grid, activities, config):
+    """Stress scores of activities on the 1 Hz grid.
+
+    activities maps activity_id to its start date. The stress of an activity
+    is its TSS when it has power, its hrTSS otherwise. Returns {activity_id:
+    {date, tss, trimp, stress}}, activities without power or heart rate are
+    left out.
+    """
+    thresholds = pl.DataFrame(
+        [(int(activity_id), *map(float, _hr_thresholds(config, start_date)))
+         for activity_id, start_date in activities.items()],
+        schema={'activity_id': pl.Int64, 'hr_rest': pl.Float64, 'hr_max': pl.Float64, 'threshold_hr': pl.Float64},
+        orient='row',
+    )
+    ftps = {activity_id: thresholds_for(config, start_date)[1] for activity_id, start_date in activities.items()}
+    power = power_metrics(grid, ftps)
+    heart_rate = heart_rate_load(grid, thresholds)
+
+    stress = {}
+    for activity_id, start_date in activities.items():
+        tss = power.get(activity_id, {}).get('training_stress_score')
+        trimp, hr_tss = heart_rate.get(activity_id, (None, None))
+        if tss is None and trimp is None:
+            continue
+        stress[activity_id] = {
+            'date': start_date[:10],
+            'tss': tss,
+            'trimp': trimp,
+            'stress': tss if tss is not None else hr_tss,
+        }
+    return stress
+
+
+def daily_load(stress_by_day, start, end, seed=(0.0, 0.0)):
+    """Daily stress, CTL, ATL and TSB from start to end (dates, inclusive).
+
+    stress_by_day maps dates to the day's total stress, days without
+    activities count as 0. seed is the (CTL, ATL) of the day before start. The
+    loads are exponentially weighted means, CTL = CTL + (stress - CTL) / 42
+    each day, computed as one ewm pass over a series led by the seed. TSB is
+    the balance going into the day, yesterday's CTL - ATL.
+    """
+    days = pl.date_range(start, end, '1d', eager=True)
+    stress = pl.Series('stress', [stress_by_day.get(day, 0.0) for day in days], dtype=pl.Float64)
+    ctl_seed, atl_seed = seed
+    loads = pl.DataFrame({
+        'ctl': pl.concat([pl.Series([ctl_seed], dtype=pl.Float64), stress]),
+        'atl': pl.concat([pl.Series([atl_seed], dtype=pl.Float64), stress]),
+    }).select(
+        pl.col('ctl').ewm_mean(alpha=1 / CTL_DAYS, adjust=False),
+        pl.col('atl').ewm_mean(alpha=1 / ATL_DAYS, adjust=False),
+    )
+    balance = (loads['ctl'] - loads['atl'])[:-1]
+    return pl.DataFrame({'date': days, 'stress': stress}).with_columns(
+        loads['ctl'][1:].alias('ctl'),
+        loads['atl'][1:].alias('atl'),
+        balance.alias('tsb'),
+    )
+
+
+def load_state(version=None):
+    """Stress scores of the activities seen so far and the daily series computed from them.
+
+    State scored under another zone config version is discarded, so every
+    activity is scored again.
+    """
+    empty = {'zone_config_version': version, 'activities': {}}, pl.DataFrame(schema=DAILY_SCHEMA)
+    if not STATE_PATH.exists():
+        return empty
+    with open(STATE_PATH) as f:
+        state = json.load(f)
+    if state.get('zone_config_version') != version:
+        print("Zone config changed since the training load was scored, scoring every activity again")
+        return empty
+    daily = pl.read_parquet(DAILY_PATH) if DAILY_PATH.exists() else pl.DataFrame(schema=DAILY_SCHEMA)
+    return state, daily
+
+
+def save_state(state, daily):
+    """Write the daily series, then the state listing the activities it covers"""
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = DAILY_PATH.with_suffix(".tmp")
+    daily.write_parquet(tmp_path)
+    os.replace(tmp_path, DAILY_PATH)
+
+    tmp_path = STATE_PATH.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, STATE_PATH)
+
+
+def update_training_load(grid=None, index=None, config=None, today=None):
+    """Score activities not seen before and bring the daily series up to today.
+
+    Only the days from the earliest new activity (or the last stored day) on
+    are recomputed, seeded with the stored loads of the day before, except
+    after a zone config change, when every activity is scored again. grid is
+    the 1 Hz grid from resample_1hz() if the caller already built one, new
+    activities it does not cover are resampled from the store. Returns the
+    state and the daily series.
+    """
+    index = index or read_index()
+    config = config or load_zone_config()
+    today = today or datetime.now(timezone.utc).date()
+    state, daily = load_state(zone_config_version(config))
+
+    new = {activity_id: entry['start_date'] for activity_id, entry in index['activities'].items()
+           if activity_id not in state['activities']}
+    if new:
+        new_ids = [int(activity_id) for activity_id in new]
+        frames = []
+        covered = set()
+        if grid is not None:
+            frames.append(grid.lazy().filter(pl.col('activity_id').is_in(new_ids)).collect())
+            covered = {str(activity_id) for activity_id in frames[0]['activity_id'].unique()}
+        missing = [activity_id for activity_id in new if activity_id not in covered]
+        if missing:
+            frames.append(resample_1hz(scan_streams(activity_ids=missing)).collect())
+        stress = activity_stress(pl.concat(frames), new, config)
+        for activity_id, start_date in new.items():
+            # Activities without power or heart rate are recorded too, so they are not scored again
+            state['activities'][activity_id] = stress.get(
+                activity_id, {'date': start_date[:10], 'tss': None, 'trimp': None, 'stress': None}
+            )
+
+    scored = [entry for entry in state['activities'].values() if entry['stress'] is not None]
+    if not scored:
+        return state, daily
+
+    stress_by_day = {}
+    for entry in scored:
+        day = date.fromisoformat(entry['date'])
+        stress_by_day[day] = stress_by_day.get(day, 0.0) + entry['stress']
+
+    first_day = min(stress_by_day)
+    start = first_day
+    seed = (0.0, 0.0)
+    if not daily.is_empty():
+        changed = [date.fromisoformat(entry['date']) for activity_id, entry in state['activities'].items()
+                   if activity_id in new and entry['stress'] is not None]
+        # Resume from the last stored day, or earlier if a new activity is backdated
+        start = max(first_day, min([daily['date'].max(), *changed]))
+        previous = daily.filter(pl.col('date') == start - timedelta(days=1))
+        if not previous.is_empty():
+            seed = (previous['ctl'][0], previous['atl'][0])
+        daily = daily.filter(pl.col('date') < start)
+    else:
+        daily = pl.DataFrame(schema=DAILY_SCHEMA)
+
+    end = max(today, max(stress_by_day))
+    daily = pl.concat([daily, daily_load(stress_by_day, start, end, seed)])
+    save_state(state, daily)
+    print(f"Scored {len(new)} new activities, training load updated from {start} to {end}")
+    return state, daily
+
+
+def training_load_summary(daily, days=REPORT_DAYS):
+    """Current CTL, ATL and TSB with the daily series of the last `days` days"""
+    if daily.is_empty():
+        return None
+    recent = daily.tail(days).with_columns(pl.col('date').cast(pl.String), pl.col(pl.Float64).round(1))
+    current = recent.row(-1, named=True)
+    return {
+        'current': {'date': current['date'], 'ctl': current['ctl'], 'atl': current['atl'], 'tsb': current['tsb']},
+        'ctl_days': CTL_DAYS,
+        'atl_days': ATL_DAYS,
+        'daily': recent.to_dicts(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the CTL/ATL/TSB training load over the full history")
+    parser.add_argument('--rebuild', action='store_true', help="discard the stored stress scores and daily series first")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        for path in [STATE_PATH, DAILY_PATH]:
+            if path.exists():
+                path.unlink()
+
+    consolidate()
+    _, daily = update_training_load()
+    OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(OUTPUT_PATH, 'w') as f:
+        json.dump(training_load_summary(daily), f, indent=2)
+    print(f"Training load exported to {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
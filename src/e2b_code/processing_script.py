@@ -25,20 +25,9 @@ def read_data_files(data_dir='/home/user/data'):
             # Handle different file formats based on extension
             if file_path.endswith('.json'):
                 try:
-                    # For the problematic Strava file, use a special handling
-                    if "strava_llm_analysis_data.json" in file_path:
-                        with open(file_path, 'r') as f:
-                            content = f.read()
-                            # Find where the valid JSON ends (likely at a closing bracket)
-                            # This is a simplified approach - might need adjustment
-                            last_bracket = content.rfind('}')
-                            if last_bracket > 0:
-                                content = content[:last_bracket+1]
-                            data = json.loads(content)
-                    else:
-                        with open(file_path, 'r') as f:
-                            data = json.load(f)
-                            
+                    with open(file_path, 'r') as f:
+                        data = json.load(f)
+
                     # Determine file type by content and add to appropriate list
                     if any(key in data for key in ['heart_rate', 'sleep_stages', 'hrv']):
                         sleep_data.append(data)
@@ -99,6 +88,18 @@ def read_data_files(data_dir='/home/user/data'):
     
     return sleep_data, workout_data
 
+def read_baselines(data_dir='/home/user/data'):
+    """Read the rolling HRV and resting heart rate baselines, if they were exported."""
+    baselines_path = os.path.join(data_dir, 'sleep_baselines.json')
+    if not os.path.exists(baselines_path):
+        return None
+    try:
+        with open(baselines_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error reading baselines {baselines_path}: {str(e)}")
+        return None
+
 # Helper functions to parse CSV files
 def parse_sleep_csv(file_path):
     """Parse a sleep data CSV file into a dictionary format."""
@@ -141,9 +142,10 @@ def parse_activity_csv(file_path):
         print(f"Error parsing activity CSV {file_path}: {str(e)}")
         return None
 
-def create_grok_prompt(sleep_data, workout_data):
+def create_grok_prompt(sleep_data, workout_data, baselines=None):
     """Create a prompt for Grok based on the data."""
     sleep_summary = json.dumps(sleep_data[-1] if sleep_data else {})  # Latest sleep data
+    baselines_summary = json.dumps(baselines) if baselines else "Not available"
     
     # Format workout data from last 3 days
     three_days_ago = datetime.now() - timedelta(days=3)
@@ -160,6 +162,10 @@ def create_grok_prompt(sleep_data, workout_data):
     Sleep data from last night:
     {sleep_summary}
 
+    Last night's HRV SDNN and minimum sleeping heart rate compared to my 7-day and 28-day
+    baselines (mean, standard deviation and z-score of last night against each baseline):
+    {baselines_summary}
+
     Workout data from the past three days:
     {workouts_summary}
 
@@ -344,9 +350,10 @@ def main():
     
     # Read data files
     sleep_data, workout_data = read_data_files()
+    baselines = read_baselines()
     
     # Create prompt
-    prompt = create_grok_prompt(sleep_data, workout_data)
+    prompt = create_grok_prompt(sleep_data, workout_data, baselines)
     
     # Get recommendation
     recommendation = get_grok_recommendation(prompt)
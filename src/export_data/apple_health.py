@@ -0,0 +1,280 @@
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+
+import polars as pl
+
+from src.export_data.apple_store import SINK_COLUMNS, to_store_frame
+from src.export_data.process_pool import spawn_pool
+
+CONFIG_PATH = 'src/export_data/apple_health_config.json'
+# Location of the health records inside the export.zip produced by the iPhone
+EXPORT_MEMBER = 'apple_health_export/export.xml'
+
+# Block size used when scanning for chunk boundaries and feeding chunks to the parser
+READ_SIZE = 1 << 20
+# How far back to look for an unclosed <Correlation> around a candidate boundary
+CORRELATION_LOOKBACK = 1 << 16
+
+
+def load_config(path=CONFIG_PATH):
+    """Load the record types to extract and the progress interval"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def _export_member(archive):
+    """Return the name of the main export XML inside an export.zip"""
+    names = archive.namelist()
+    if EXPORT_MEMBER in names:
+        return EXPORT_MEMBER
+    # Localised exports rename the file, take the top-level XML that is not the CDA document
+    for name in names:
+        if name.count('/') == 1 and name.endswith('.xml') and 'cda' not in name.lower():
+            return name
+    raise FileNotFoundError(f"No export XML found in {archive.filename}")
+
+
+@contextmanager
+def open_export(path):
+    """Open export.xml, or stream-decompress it straight out of export.zip without unpacking"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive, archive.open(_export_member(archive)) as member:
+            yield member
+    else:
+        with open(path, 'rb') as f:
+            yield f
+
+
+def _epoch_us(timestamp):
+    """Parse an export timestamp such as '2025-03-20 23:15:00 +0100' to UTC epoch microseconds"""
+    if not timestamp:
+        return None
+    return int(datetime.fromisoformat(timestamp).timestamp() * 1_000_000)
+
+
+class RecordSink:
+    """Collects the records of a single HealthKit record type as typed columns.
+
+    Timestamps and numeric values are parsed once here, so later stages never
+    touch the raw attribute strings. When ``since`` is set, records created at
+    or before it are skipped so that an incremental run only keeps what is new
+    in the export.
+    """
+
+    def __init__(self, record_type, since=None):
+        self.record_type = record_type
+        self.since = since
+        self._since_us = int(since.timestamp() * 1_000_000) if since is not None else None
+        # Category records (sleep stages, ...) carry a label instead of a number
+        self._is_category = record_type.startswith('HKCategoryTypeIdentifier')
+        self.columns = {name: [] for name in SINK_COLUMNS}
+
+    def __len__(self):
+        return len(self.columns['start_date'])
+
+    def add(self, attrib):
+        created = _epoch_us(attrib.get('creationDate'))
+        if self._since_us is not None and created is not None and created <= self._since_us:
+            return
+
+        columns = self.columns
+        columns['start_date'].append(_epoch_us(attrib.get('startDate')))
+        columns['end_date'].append(_epoch_us(attrib.get('endDate')))
+        columns['creationDate'].append(created)
+        value = attrib.get('value')
+        numeric = None
+        if value and not self._is_category:
+            try:
+                numeric = float(value)
+            except ValueError:
+                pass
+        columns['value'].append(numeric)
+        columns['category_value'].append(value if numeric is None else None)
+        columns['unit'].append(attrib.get('unit'))
+        columns['sourceName'].append(attrib.get('sourceName'))
+        columns['sourceVersion'].append(attrib.get('sourceVersion'))
+        columns['device'].append(attrib.get('device'))
+
+    def to_frame(self):
+        """Return the collected records as a typed frame with the store layout"""
+        return to_store_frame(self.record_type, self.columns)
+
+
+def iter_health_records(source, record_types=None, progress_every=100_000):
+    """Stream the attributes of every <Record> in an Apple Health export.
+
+    The export is parsed incrementally and each element is cleared as soon as
+    it has been handled, so memory stays flat regardless of the export size.
+    """
+    seen = 0
+    depth = 0
+    root = None
+    started = time.perf_counter()
+
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+
+        depth -= 1
+        if elem.tag == "Record":
+            seen += 1
+            if record_types is None or elem.get("type") in record_types:
+                # Copy the attributes, the element is cleared right after
+                yield dict(elem.attrib)
+            elem.clear()
+
+            if progress_every and seen % progress_every == 0:
+                elapsed = time.perf_counter() - started
+                print(f"Parsed {seen:,} records ({seen / elapsed:,.0f} records/s)")
+
+        # Drop finished top-level elements (Records, Workouts, ...) from the root
+        if depth == 1:
+            root.clear()
+
+    if progress_every:
+        elapsed = time.perf_counter() - started
+        print(f"Parsed {seen:,} records in {elapsed:.1f}s ({seen / max(elapsed, 1e-9):,.0f} records/s)")
+
+
+def extract_records(source, record_types, progress_every=100_000, since=None):
+    """Route every wanted record to its per-type sink in a single pass over the export.
+
+    since maps record types to the high-water mark their sink filters on,
+    types missing from it keep every record.
+    """
+    since = since or {}
+    # Type lookup table: one dict hit per record instead of one tree walk per type
+    sinks = {record_type: RecordSink(record_type, since=since.get(record_type)) for record_type in record_types}
+
+    for attrib in iter_health_records(source, record_types=sinks, progress_every=progress_every):
+        sinks[attrib['type']].add(attrib)
+
+    return sinks
+
+
+class _ChunkReader:
+    """File-like view of one byte range of the export, wrapped in a synthetic root element"""
+
+    def __init__(self, path, start, end):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+        self._pending = [b"<chunk>"]
+
+    def read(self, size=READ_SIZE):
+        if self._pending:
+            return self._pending.pop(0)
+        if self._remaining > 0:
+            data = self._file.read(min(size, self._remaining))
+            self._remaining -= len(data)
+            if not data:
+                self._remaining = 0
+            if self._remaining == 0:
+                self._pending.append(b"</chunk>")
+            return data
+        self._file.close()
+        return b""
+
+
+def _find(f, needle, start, end=None):
+    """Return the offset of the first ``needle`` at or after ``start``, or None"""
+    position = start
+    while end is None or position < end:
+        f.seek(position)
+        block = f.read(READ_SIZE + len(needle))
+        if not block:
+            return None
+        index = block.find(needle)
+        if index >= 0:
+            found = position + index
+            return found if end is None or found < end else None
+        position += READ_SIZE
+    return None
+
+
+def _next_record_boundary(f, position, end):
+    """Return the first top-level <Record start at or after ``position``.
+
+    Records nested in a <Correlation> are skipped, a chunk must never start
+    inside another element.
+    """
+    while position < end:
+        found = _find(f, b"<Record ", position, end)
+        if found is None:
+            return end
+
+        lookback = max(0, found - CORRELATION_LOOKBACK)
+        f.seek(lookback)
+        window = f.read(found - lookback)
+        if window.rfind(b"<Correlation ") <= window.rfind(b"</Correlation>"):
+            return found
+
+        # Inside a correlation, resume the search after its closing tag
+        closing = _find(f, b"</Correlation>", found, end)
+        if closing is None:
+            return end
+        position = closing
+    return end
+
+
+def find_chunk_ranges(path, chunks):
+    """Split the export into byte ranges that each hold only complete elements"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        # First chunk starts right after the <HealthData ...> start tag
+        root_start = _find(f, b"<HealthData", 0)
+        first = _find(f, b">", root_start) + 1
+        last = _find(f, b"</HealthData>", max(first, size - READ_SIZE)) or size
+
+        step = (last - first) / chunks
+        boundaries = [first]
+        for i in range(1, chunks):
+            boundary = _next_record_boundary(f, int(first + i * step), last)
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+        boundaries.append(last)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _parse_chunk(task):
+    """Extract one byte range of the export into typed per-type frames (runs in a worker)"""
+    path, start, end, record_types, since = task
+    sinks = {record_type: RecordSink(record_type, since=since.get(record_type)) for record_type in record_types}
+
+    for attrib in iter_health_records(_ChunkReader(path, start, end), record_types=sinks, progress_every=0):
+        sinks[attrib['type']].add(attrib)
+
+    return {record_type: sink.to_frame() for record_type, sink in sinks.items()}
+
+
+def extract_records_parallel(path, record_types, workers, since=None, chunks_per_worker=4):
+    """Parse byte-range chunks of an uncompressed export in a process pool.
+
+    Returns one typed frame per record type, in the same row order as the
+    serial ``extract_records`` path. ``since`` maps record types to their
+    high-water mark, as for ``extract_records``.
+    """
+    ranges = find_chunk_ranges(path, workers * chunks_per_worker)
+    tasks = [(path, start, end, list(record_types), since or {}) for start, end in ranges]
+    frames_by_type = {record_type: [] for record_type in record_types}
+
+    started = time.perf_counter()
+    with spawn_pool(workers) as pool:
+        # map keeps chunk order, so concatenating per type preserves document order
+        for index, chunk_frames in enumerate(pool.map(_parse_chunk, tasks), start=1):
+            for record_type, frame in chunk_frames.items():
+                frames_by_type[record_type].append(frame)
+            done = sum(len(frame) for frames in frames_by_type.values() for frame in frames)
+            elapsed = time.perf_counter() - started
+            print(f"Parsed chunk {index}/{len(tasks)}: {done:,} records kept ({done / elapsed:,.0f} records/s)")
+
+    return {record_type: pl.concat(frames) for record_type, frames in frames_by_type.items()}
@@ -0,0 +1,145 @@
+import json
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+
+# Parquet dataset laid out as record_type=<type>/month=<YYYY-MM>/part-*.parquet
+STORE_DIR = 'src/export_data/data/apple_health'
+MANIFEST_NAME = 'manifest.json'
+
+# Share one string cache so categorical columns from separate frames and files line up
+pl.enable_string_cache()
+
+# Fixed, typed column layout of the store
+STORE_SCHEMA = {
+    'record_type': pl.Categorical,
+    'start_date': pl.Datetime("us", "UTC"),
+    'end_date': pl.Datetime("us", "UTC"),
+    'creationDate': pl.Datetime("us", "UTC"),
+    'value': pl.Float64,
+    'category_value': pl.Categorical,
+    'unit': pl.Categorical,
+    'sourceName': pl.Categorical,
+    'sourceVersion': pl.String,
+    'device': pl.Categorical,
+}
+DATE_COLUMNS = ['start_date', 'end_date', 'creationDate']
+
+# Column buffers filled by the extraction sinks: timestamps as UTC epoch microseconds
+SINK_SCHEMA = {
+    'start_date': pl.Int64,
+    'end_date': pl.Int64,
+    'creationDate': pl.Int64,
+    'value': pl.Float64,
+    'category_value': pl.String,
+    'unit': pl.String,
+    'sourceName': pl.String,
+    'sourceVersion': pl.String,
+    'device': pl.String,
+}
+SINK_COLUMNS = list(SINK_SCHEMA)
+
+PARTITION_SCHEMA = {'record_type': pl.String, 'month': pl.String}
+
+
+def read_manifest(store_dir=STORE_DIR):
+    """Return the store manifest, or an empty one for a new store"""
+    manifest_path = Path(store_dir) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {'high_water_marks': {}, 'total_rows': 0, 'partitions': {}}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, store_dir=STORE_DIR):
+    """Atomically replace the store manifest"""
+    manifest_path = Path(store_dir) / MANIFEST_NAME
+    tmp_path = manifest_path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def high_water_marks(manifest):
+    """Return the newest stored creationDate of each record type with partitions, as datetimes.
+
+    Record types missing from the result have no stored records yet, so a type
+    added to the config later still gets its whole history. Manifests with a
+    single store-wide mark apply it to the types that already have partitions.
+    """
+    stored_types = {partition.split('/')[0].removeprefix('record_type=') for partition in manifest['partitions']}
+    marks = manifest.get('high_water_marks')
+    if marks is None:
+        legacy = manifest.get('high_water_mark')
+        marks = {record_type: legacy for record_type in stored_types} if legacy else {}
+    return {
+        record_type: datetime.fromisoformat(mark)
+        for record_type, mark in marks.items()
+        if mark and record_type in stored_types
+    }
+
+
+def to_store_frame(record_type, columns):
+    """Build a typed frame with the store layout from a sink's column buffers"""
+    df = pl.DataFrame(columns, schema=SINK_SCHEMA)
+    return df.with_columns(
+        pl.lit(record_type).alias('record_type'),
+        pl.col(DATE_COLUMNS).cast(pl.Datetime("us")).dt.replace_time_zone("UTC"),
+    ).select(STORE_SCHEMA.keys()).cast(STORE_SCHEMA)
+
+
+def append_records(df, store_dir=STORE_DIR):
+    """Append new records to the partitioned store and advance each record type's high-water mark"""
+    if df.is_empty():
+        return 0
+
+    manifest = read_manifest(store_dir)
+    marks = {record_type: mark.isoformat() for record_type, mark in high_water_marks(manifest).items()}
+    part_name = f"part-{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+
+    df = df.with_columns(pl.col('start_date').dt.strftime('%Y-%m').alias('month'))
+    for (record_type, month), part in df.partition_by('record_type', 'month', as_dict=True).items():
+        partition = f"record_type={record_type}/month={month}"
+        part_dir = Path(store_dir) / partition
+        part_dir.mkdir(parents=True, exist_ok=True)
+        # Partition columns are encoded in the path, not stored in the file
+        part.drop('record_type', 'month').write_parquet(part_dir / part_name)
+        manifest['partitions'][partition] = manifest['partitions'].get(partition, 0) + len(part)
+
+    # Only advance the high-water marks once all partitions are written
+    newest_by_type = df.group_by('record_type').agg(pl.col('creationDate').max())
+    for record_type, newest in newest_by_type.iter_rows():
+        # Records without a creationDate cannot advance the mark
+        if newest is None:
+            continue
+        previous = marks.get(record_type)
+        if previous is None or newest > datetime.fromisoformat(previous):
+            marks[record_type] = newest.isoformat()
+    manifest.pop('high_water_mark', None)
+    manifest['high_water_marks'] = marks
+    manifest['total_rows'] += len(df)
+    write_manifest(manifest, store_dir)
+
+    return len(df)
+
+
+def scan_records(store_dir=STORE_DIR, record_types=None, months=None):
+    """Lazily scan the store, only opening the requested record type and month partitions"""
+    type_dirs = [f"record_type={t}" for t in record_types] if record_types else ["record_type=*"]
+    month_dirs = [f"month={m}" for m in months] if months else ["month=*"]
+
+    paths = sorted(
+        str(path)
+        for type_dir in type_dirs
+        for month_dir in month_dirs
+        for path in Path(store_dir).glob(f"{type_dir}/{month_dir}/*.parquet")
+    )
+    if not paths:
+        return pl.LazyFrame(schema={**STORE_SCHEMA, 'month': pl.String})
+
+    return pl.scan_parquet(paths, hive_partitioning=True, hive_schema=PARTITION_SCHEMA).with_columns(
+        pl.col('record_type').cast(pl.Categorical)
+    )
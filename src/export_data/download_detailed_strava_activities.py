@@ -1,322 +1,351 @@
 import requests
 import json
-import csv
+import argparse
 import polars as pl
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import time
-import numpy as np
-
-# Get the tokens from file to connect to Strava
-with open('strava_token.json') as json_file:
-    strava_tokens = json.load(json_file)
-
-# Check if access token has expired
-current_time = datetime.now().timestamp()
-if strava_tokens['expires_at'] < current_time:
-    # Make Strava auth API call with refresh token
-    response = requests.post(
-        'https://www.strava.com/oauth/token',
-        data={
-            'client_id': strava_tokens['client_id'],
-            'client_secret': strava_tokens['client_secret'],
-            'grant_type': 'refresh_token',
-            'refresh_token': strava_tokens['refresh_token']
-        }
-    )
-    
-    # Save response as json in new variable
-    new_strava_tokens = response.json()
-    
-    # Save new tokens to file
-    with open('strava_token.json', 'w') as outfile:
-        json.dump(new_strava_tokens, outfile)
-    
-    # Use new access token
-    access_token = new_strava_tokens['access_token']
-else:
-    # Use current access token
-    access_token = strava_tokens['access_token']
 
-# Calculate timestamp for 3 days ago
-three_days_ago = int((datetime.now() - timedelta(days=3)).timestamp())
+from src.export_data.http_cache import ResponseCache
+from src.export_data.job_queue import FAILED, JobQueue
+from src.export_data.stream_store import consolidate
+from src.export_data.strava_api import StravaClient
+from src.export_data.strava_streams import read_streams, recorded_channels, streams_frame, streams_path, write_streams
+from src.export_data.zones import (
+    CYCLING_SPORT_TYPES,
+    calculate_hr_zones,
+    calculate_power_zones,
+    calculate_time_in_zones,
+    load_zone_config,
+    thresholds_for,
+    zone_config_version,
+)
 
-# Get activities after this timestamp
-activities_url = "https://www.strava.com/api/v3/athlete/activities"
-params = {
-    'access_token': access_token,
-    'after': three_days_ago,
-    'per_page': 100  # Max 200, but 100 is more reliable
-}
+# Run from the repository root: python -m src.export_data.download_detailed_strava_activities [--workers N] [--sync]
+output_dir = 'src/export_data/data/detailed_activities'
+# Activity IDs already downloaded and the newest start_date of the last complete sync
+MANIFEST_PATH = 'src/export_data/data/strava_manifest.json'
+# Save the manifest every this many activities so an interrupted sync resumes close to where it stopped
+MANIFEST_CHECKPOINT_EVERY = 50
 
-# Get activities
-response = requests.get(activities_url, params=params)
-activities = response.json()
 
-print(f"Found {len(activities)} activities in the last 3 days")
+def load_manifest(path=MANIFEST_PATH):
+    """Load the sync manifest, or an empty one"""
+    if not os.path.exists(path):
+        return {'watermark': None, 'activities': {}}
+    with open(path) as f:
+        return json.load(f)
 
-# Create output directory if it doesn't exist
-output_dir = 'src/export_data/data/detailed_activities'
-os.makedirs(output_dir, exist_ok=True)
-
-# Save basic activities data
-with open('src/export_data/data/strava_data.json', 'w') as outfile:
-    json.dump(activities, outfile)
-
-print("Basic data saved to src/export_data/data/strava_data.json")
-
-# Function to get detailed data for an activity
-def get_activity_details(activity_id):
-    """Get detailed information for a specific activity"""
-    url = f"https://www.strava.com/api/v3/activities/{activity_id}"
-    headers = {'Authorization': f'Bearer {access_token}'}
-    
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Error fetching activity {activity_id}: {response.status_code}")
-        return None
 
-# Function to get stream data for an activity
-def get_activity_streams(activity_id):
-    """Get detailed stream data for a specific activity"""
-    url = f"https://www.strava.com/api/v3/activities/{activity_id}/streams"
-    headers = {'Authorization': f'Bearer {access_token}'}
-    
-    params = {
-        'keys': 'time,distance,latlng,altitude,velocity_smooth,heartrate,cadence,watts,temp,moving',
-        'key_by_type': True
-    }
-    
-    response = requests.get(url, headers=headers, params=params)
-    
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Error fetching streams for activity {activity_id}: {response.status_code}")
-        return None
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Atomically write the sync manifest"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
 
-# Define heart rate zones (adjust according to your personal zones)
-def calculate_hr_zones(max_hr):
-    """Calculate heart rate zones based on max heart rate"""
-    return {
-        'Zone 1 (Recovery)': (0, int(max_hr * 0.6)),
-        'Zone 2 (Endurance)': (int(max_hr * 0.6), int(max_hr * 0.7)),
-        'Zone 3 (Tempo)': (int(max_hr * 0.7), int(max_hr * 0.8)),
-        'Zone 4 (Threshold)': (int(max_hr * 0.8), int(max_hr * 0.9)),
-        'Zone 5 (VO2 Max)': (int(max_hr * 0.9), int(max_hr * 1.0))
-    }
 
-# Define power zones (adjust according to your FTP)
-def calculate_power_zones(ftp):
-    """Calculate power zones based on FTP"""
-    return {
-        'Zone 1 (Active Recovery)': (0, int(ftp * 0.55)),
-        'Zone 2 (Endurance)': (int(ftp * 0.55), int(ftp * 0.75)),
-        'Zone 3 (Tempo)': (int(ftp * 0.75), int(ftp * 0.9)),
-        'Zone 4 (Threshold)': (int(ftp * 0.9), int(ftp * 1.05)),
-        'Zone 5 (VO2 Max)': (int(ftp * 1.05), int(ftp * 1.2)),
-        'Zone 6 (Anaerobic)': (int(ftp * 1.2), int(ftp * 1.5)),
-        'Zone 7 (Neuromuscular)': (int(ftp * 1.5), float('inf'))
-    }
+def activity_files(activity_id):
+    """Paths of the saved detail and streams files of an activity"""
+    return (os.path.join(output_dir, f"activity_{activity_id}.json"),
+            streams_path(output_dir, activity_id))
 
-# Calculate time in zones from stream data
-def calculate_time_in_zones(stream_data, zones, metric):
-    """Calculate time spent in each zone"""
-    if metric not in stream_data or 'time' not in stream_data:
-        return None
-    
-    # Get the data points and timestamps
-    values = stream_data[metric]
-    times = stream_data['time']
-    
-    # Calculate the time difference between data points
-    time_diffs = []
-    for i in range(1, len(times)):
-        time_diffs.append(times[i] - times[i-1])
-    # Add the last time interval (estimate based on average)
-    if time_diffs:
-        time_diffs.append(sum(time_diffs) / len(time_diffs))
-    
-    # Initialize time spent in each zone
-    time_in_zones = {zone_name: 0 for zone_name in zones.keys()}
-    
-    # Classify each data point into a zone and add its duration
-    for i, value in enumerate(values):
-        if value is None:
-            continue
-        
-        for zone_name, (zone_min, zone_max) in zones.items():
-            if zone_min <= value < zone_max:
-                time_in_zones[zone_name] += time_diffs[i]
-                break
-    
-    return time_in_zones
-
-# Process each activity
-all_activities_data = []
-
-# User's HR max and FTP (ideally these would be stored in a config or profile)
-# Replace these with your personal values
-USER_HR_MAX = 190 # Example maximum heart rate
-USER_FTP = 330 # Example FTP in watts
-
-# Calculate zones
-hr_zones = calculate_hr_zones(USER_HR_MAX)
-power_zones = calculate_power_zones(USER_FTP)
-
-for activity in activities:
+
+def is_downloaded(manifest, activity_id):
+    """Whether an activity was fetched before, by the manifest or by its files on disk"""
+    activity_file, streams_file = activity_files(activity_id)
+    if not os.path.exists(activity_file):
+        return False
+    return str(activity_id) in manifest['activities'] or os.path.exists(streams_file)
+
+
+def load_activity(activity_id):
+    """Read a previously downloaded activity's details and stream frame from disk"""
+    activity_file, _ = activity_files(activity_id)
+    with open(activity_file) as f:
+        details = json.load(f)
+    return details, read_streams(output_dir, activity_id)
+
+
+def get_access_token():
+    """Return a valid Strava access token, refreshing it if it has expired"""
+    # Get the tokens from file to connect to Strava
+    with open('strava_token.json') as json_file:
+        strava_tokens = json.load(json_file)
+
+    # Check if access token has expired
+    current_time = datetime.now().timestamp()
+    if strava_tokens['expires_at'] < current_time:
+        # Make Strava auth API call with refresh token
+        response = requests.post(
+            'https://www.strava.com/oauth/token',
+            data={
+                'client_id': strava_tokens['client_id'],
+                'client_secret': strava_tokens['client_secret'],
+                'grant_type': 'refresh_token',
+                'refresh_token': strava_tokens['refresh_token']
+            }
+        )
+
+        # Save response as json in new variable
+        new_strava_tokens = response.json()
+
+        # Save new tokens to file
+        with open('strava_token.json', 'w') as outfile:
+            json.dump(new_strava_tokens, outfile)
+
+        # Use new access token
+        return new_strava_tokens['access_token']
+
+    # Use current access token
+    return strava_tokens['access_token']
+
+def process_activity(client, activity, zone_config, manifest=None):
+    """Download, save and analyse a single activity, returning its summary row.
+
+    Activities already in the manifest (or on disk) are analysed from their
+    saved files without any request to Strava, rewriting their zone files in
+    case the zone config changed since they were downloaded.
+    """
     activity_id = activity['id']
+    if manifest is not None and is_downloaded(manifest, activity_id):
+        print(f"Already downloaded: {activity['name']} (ID: {activity_id})")
+        details, stream_df = load_activity(activity_id)
+        return summarize_activity(activity_id, details, stream_df, zone_config, save=True)
+
     print(f"Processing activity: {activity['name']} (ID: {activity_id})")
-    
+
     # Get detailed data
-    details = get_activity_details(activity_id)
-    
-    if details:
-        # Save detailed activity data
-        activity_file = os.path.join(output_dir, f"activity_{activity_id}.json")
-        with open(activity_file, 'w') as f:
-            json.dump(details, f)
-        
-        # Get streams data
-        streams = get_activity_streams(activity_id)
-        
-        hr_zone_data = {}
-        power_zone_data = {}
-        
-        if streams:
-            # Save streams data
-            streams_file = os.path.join(output_dir, f"activity_{activity_id}_streams.json")
-            with open(streams_file, 'w') as f:
-                json.dump(streams, f)
-            
-            # Process streams into DataFrame format
-            stream_data = {}
-            for stream_type, data in streams.items():
-                if 'data' in data:
-                    stream_data[stream_type] = data['data']
-            
-            # Calculate time in HR zones
-            if 'heartrate' in stream_data:
-                hr_zone_data = calculate_time_in_zones(stream_data, hr_zones, 'heartrate')
-            
-            # Calculate time in power zones (for cycling activities)
-            is_cycling = details.get('sport_type') in ['Ride', 'VirtualRide']
-            if is_cycling and 'watts' in stream_data:
-                power_zone_data = calculate_time_in_zones(stream_data, power_zones, 'watts')
-            
-            # Only create DataFrame if we have time data
-            if 'time' in stream_data:
-                # Build dict with consistent length arrays, use None for missing data
-                time_length = len(stream_data['time'])
-                df_data = {}
-                
-                for key in ['time', 'distance', 'heartrate', 'watts', 'cadence', 
-                           'velocity_smooth', 'altitude', 'temp']:
-                    if key in stream_data:
-                        df_data[key] = stream_data[key]
-                    else:
-                        df_data[key] = [None] * time_length
-                
-                # Handle latlng separately as it's an array of [lat, lng] pairs
-                if 'latlng' in stream_data:
-                    df_data['latitude'] = [coord[0] for coord in stream_data['latlng']]
-                    df_data['longitude'] = [coord[1] for coord in stream_data['latlng']]
-                else:
-                    df_data['latitude'] = [None] * time_length
-                    df_data['longitude'] = [None] * time_length
-                
-                # Create Polars DataFrame
-                stream_df = pl.DataFrame(df_data)
-                
-                # Save as CSV
-                csv_file = os.path.join(output_dir, f"activity_{activity_id}_streams.csv")
-                stream_df.write_csv(csv_file)
-                
-                print(f"  Saved detailed stream data to {csv_file}")
-        
-        # Save zone analysis to separate files
-        if hr_zone_data:
-            hr_zones_file = os.path.join(output_dir, f"activity_{activity_id}_hr_zones.json")
-            with open(hr_zones_file, 'w') as f:
-                json.dump(hr_zone_data, f)
-            print(f"  Saved heart rate zone analysis to {hr_zones_file}")
-        
-        if power_zone_data:
-            power_zones_file = os.path.join(output_dir, f"activity_{activity_id}_power_zones.json")
-            with open(power_zones_file, 'w') as f:
-                json.dump(power_zone_data, f)
-            print(f"  Saved power zone analysis to {power_zones_file}")
-        
-        # Format the zone data for our summary
-        hr_zone_summary = {}
-        for zone, seconds in hr_zone_data.items():
-            hr_zone_summary[f"hr_{zone.replace(' ', '_').lower()}"] = seconds
-            hr_zone_summary[f"hr_{zone.replace(' ', '_').lower()}_minutes"] = round(seconds / 60, 1)
-        
-        power_zone_summary = {}
-        for zone, seconds in power_zone_data.items():
-            power_zone_summary[f"power_{zone.replace(' ', '_').lower()}"] = seconds
-            power_zone_summary[f"power_{zone.replace(' ', '_').lower()}_minutes"] = round(seconds / 60, 1)
-        
-        # Add summary to our all activities data
-        activity_summary = {
-            'id': activity_id,
-            'name': details.get('name'),
-            'sport_type': details.get('sport_type'),
-            'start_date': details.get('start_date'),
-            'distance': details.get('distance'),
-            'moving_time': details.get('moving_time'),
-            'elapsed_time': details.get('elapsed_time'),
-            'total_elevation_gain': details.get('total_elevation_gain'),
-            'average_speed': details.get('average_speed'),
-            'max_speed': details.get('max_speed'),
-            'average_watts': details.get('average_watts'),
-            'weighted_average_watts': details.get('weighted_average_watts'),
-            'kilojoules': details.get('kilojoules'),
-            'average_heartrate': details.get('average_heartrate'),
-            'max_heartrate': details.get('max_heartrate'),
-            'suffer_score': details.get('suffer_score'),
-            'average_cadence': details.get('average_cadence'),
-            'average_temp': details.get('average_temp'),
-            'has_streams': streams is not None,
-            'has_hr_zones': bool(hr_zone_data),
-            'has_power_zones': bool(power_zone_data),
-            **hr_zone_summary,
-            **power_zone_summary
-        }
-        
-        all_activities_data.append(activity_summary)
-    
-    # Sleep to avoid API rate limits
-    time.sleep(1)
-
-# Create summary DataFrame
-if all_activities_data:
-    activities_df = pl.DataFrame(all_activities_data)
-    activities_csv = 'src/export_data/data/activities_last_3_days.csv'
-    activities_df.write_csv(activities_csv)
-    print(f"\nSaved summary of all activities to {activities_csv}")
-    print(f"Total activities processed: {len(all_activities_data)}")
-    
-    # Print some zone analysis summaries
-    for activity in all_activities_data:
-        print(f"\nActivity: {activity['name']} ({activity['sport_type']})")
-        
-        if activity['has_hr_zones']:
-            print("  Heart Rate Zone Analysis (minutes):")
-            for key in sorted([k for k in activity.keys() if k.startswith('hr_') and k.endswith('_minutes')]):
-                zone_name = key.replace('hr_', '').replace('_minutes', '').replace('_', ' ')
-                print(f"    {zone_name.title()}: {activity[key]}")
-        
-        if activity['has_power_zones']:
-            print("  Power Zone Analysis (minutes):")
-            for key in sorted([k for k in activity.keys() if k.startswith('power_') and k.endswith('_minutes')]):
-                zone_name = key.replace('power_', '').replace('_minutes', '').replace('_', ' ')
-                print(f"    {zone_name.title()}: {activity[key]}")
-else:
-    print("No activities found in the last 3 days")
-
-print("\nProcess completed!")
\ No newline at end of file
+    details = client.get_activity_details(activity_id)
+    if not details:
+        return None
+
+    # Get streams data as a typed frame, only activities with a time stream have one
+    streams = client.get_activity_streams(activity_id)
+    stream_df = streams_frame(streams) if streams else None
+
+    # Save detailed activity data, the detail file is written last so an
+    # interrupted download is never mistaken for a complete one
+    activity_file, streams_file = activity_files(activity_id)
+    if stream_df is not None:
+        write_streams(stream_df, streams_file)
+        print(f"  Saved detailed stream data to {streams_file}")
+    with open(activity_file, 'w') as f:
+        json.dump(details, f)
+
+    return summarize_activity(activity_id, details, stream_df, zone_config, save=True)
+
+def summarize_activity(activity_id, details, stream_df, zone_config, save=False):
+    """Compute zones and the summary row of an activity, saving the zone files if asked"""
+    hr_zone_data = {}
+    power_zone_data = {}
+
+    if stream_df is not None:
+        # Zones from the HR max and FTP that applied on the day of the activity
+        hr_max, ftp = thresholds_for(zone_config, details['start_date'])
+        hr_zones = calculate_hr_zones(hr_max)
+        power_zones = calculate_power_zones(ftp)
+        stream_data = recorded_channels(stream_df)
+
+        # Calculate time in HR zones
+        if 'heartrate' in stream_data:
+            hr_zone_data = calculate_time_in_zones(stream_data, hr_zones, 'heartrate')
+
+        # Calculate time in power zones (for cycling activities)
+        is_cycling = details.get('sport_type') in CYCLING_SPORT_TYPES
+        if is_cycling and 'watts' in stream_data:
+            power_zone_data = calculate_time_in_zones(stream_data, power_zones, 'watts')
+
+    # Save zone analysis to separate files
+    if save and hr_zone_data:
+        hr_zones_file = os.path.join(output_dir, f"activity_{activity_id}_hr_zones.json")
+        with open(hr_zones_file, 'w') as f:
+            json.dump(hr_zone_data, f)
+        print(f"  Saved heart rate zone analysis to {hr_zones_file}")
+
+    if save and power_zone_data:
+        power_zones_file = os.path.join(output_dir, f"activity_{activity_id}_power_zones.json")
+        with open(power_zones_file, 'w') as f:
+            json.dump(power_zone_data, f)
+        print(f"  Saved power zone analysis to {power_zones_file}")
+
+    # Format the zone data for our summary
+    hr_zone_summary = {}
+    for zone, seconds in hr_zone_data.items():
+        hr_zone_summary[f"hr_{zone.replace(' ', '_').lower()}"] = seconds
+        hr_zone_summary[f"hr_{zone.replace(' ', '_').lower()}_minutes"] = round(seconds / 60, 1)
+
+    power_zone_summary = {}
+    for zone, seconds in power_zone_data.items():
+        power_zone_summary[f"power_{zone.replace(' ', '_').lower()}"] = seconds
+        power_zone_summary[f"power_{zone.replace(' ', '_').lower()}_minutes"] = round(seconds / 60, 1)
+
+    # Summary row for all activities data
+    return {
+        'id': activity_id,
+        'name': details.get('name'),
+        'sport_type': details.get('sport_type'),
+        'start_date': details.get('start_date'),
+        'distance': details.get('distance'),
+        'moving_time': details.get('moving_time'),
+        'elapsed_time': details.get('elapsed_time'),
+        'total_elevation_gain': details.get('total_elevation_gain'),
+        'average_speed': details.get('average_speed'),
+        'max_speed': details.get('max_speed'),
+        'average_watts': details.get('average_watts'),
+        'weighted_average_watts': details.get('weighted_average_watts'),
+        'kilojoules': details.get('kilojoules'),
+        'average_heartrate': details.get('average_heartrate'),
+        'max_heartrate': details.get('max_heartrate'),
+        'suffer_score': details.get('suffer_score'),
+        'average_cadence': details.get('average_cadence'),
+        'average_temp': details.get('average_temp'),
+        'has_streams': stream_df is not None,
+        'has_hr_zones': bool(hr_zone_data),
+        'has_power_zones': bool(power_zone_data),
+        **hr_zone_summary,
+        **power_zone_summary
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Download detailed Strava activities")
+    parser.add_argument('--workers', type=int, default=8,
+                        help="activities fetched concurrently, requests are paced by the rate limiter")
+    parser.add_argument('--cache-max-age', type=float, default=0,
+                        help="serve cached responses younger than this many seconds without asking Strava")
+    parser.add_argument('--sync', action='store_true',
+                        help="fetch every activity since the last complete sync (the full history on the first run)")
+    args = parser.parse_args()
+
+    # One client for all workers so they share the rate limiter, connection pool and response cache
+    response_cache = ResponseCache()
+    client = StravaClient(
+        get_access_token(),
+        pool_size=args.workers,
+        cache=response_cache,
+        cache_max_age=args.cache_max_age,
+    )
+
+    manifest = load_manifest()
+    zone_config = load_zone_config()
+    # Summary rows computed under another zone config are recomputed
+    config_version = zone_config_version(zone_config)
+
+    if args.sync and manifest['watermark']:
+        # Only activities that started after the newest one of the last complete sync
+        after = int(datetime.fromisoformat(manifest['watermark'].replace('Z', '+00:00')).timestamp())
+        description = f"since {manifest['watermark']}"
+    elif args.sync:
+        after = 0
+        description = "in the full history"
+    else:
+        # Calculate timestamp for 3 days ago
+        after = int((datetime.now() - timedelta(days=3)).timestamp())
+        description = "in the last 3 days"
+
+    # Page through every activity after this timestamp
+    activities = list(client.iter_activities(after=after))
+
+    print(f"Found {len(activities)} activities {description}")
+
+    # Create output directory if it doesn't exist
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Save basic activities data
+    with open('src/export_data/data/strava_data.json', 'w') as outfile:
+        json.dump(activities, outfile)
+
+    print("Basic data saved to src/export_data/data/strava_data.json")
+
+    # Every activity is a job in the persistent queue, finished jobs keep their
+    # summary row so a restarted run only does the unfinished ones, and the ones
+    # whose row was computed under another zone config
+    queue = JobQueue()
+    queue.enqueue(activities, config_version)
+
+    manifest_lock = threading.Lock()
+    completed = []
+
+    def run_jobs():
+        while (activity := queue.claim()) is not None:
+            try:
+                summary = process_activity(client, activity, zone_config, manifest)
+                if not summary:
+                    raise RuntimeError("no activity details returned")
+            except Exception as e:
+                if queue.fail(activity['id'], e) == FAILED:
+                    print(f"Giving up on activity {activity['id']}: {e}")
+                continue
+            queue.complete(activity['id'], summary, config_version)
+            with manifest_lock:
+                manifest['activities'][str(activity['id'])] = activity['start_date']
+                completed.append(activity['id'])
+                if len(completed) % MANIFEST_CHECKPOINT_EVERY == 0:
+                    save_manifest(manifest)
+
+    # Process jobs concurrently, the shared rate limiter keeps us within Strava's quotas
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        workers = [pool.submit(run_jobs) for _ in range(args.workers)]
+        for worker in workers:
+            worker.result()
+
+    all_activities_data = queue.summaries([activity['id'] for activity in activities])
+    print(f"Jobs: {queue.counts()}")
+    queue.close()
+
+    pruned = response_cache.prune()
+    if pruned:
+        print(f"Pruned {pruned} stale entries from the response cache")
+
+    # Only a sync advances the watermark, and only once every listed activity is
+    # downloaded: an interrupted sync lists the same range again and skips what it
+    # already has, and a 3-day run never moves the start of the first full sync
+    if args.sync and len(all_activities_data) == len(activities):
+        start_dates = [activity['start_date'] for activity in activities]
+        if manifest['watermark']:
+            start_dates.append(manifest['watermark'])
+        if start_dates:
+            manifest['watermark'] = max(start_dates)
+    save_manifest(manifest)
+
+    # Add the new activities to the consolidated stream dataset
+    consolidated = consolidate(output_dir)
+    if consolidated:
+        print(f"Added {consolidated} activities to the consolidated stream dataset")
+
+    # Create summary DataFrame. Rows are kept in the queue as jobs finish and the
+    # CSV is written once here: its columns are the union of every row's zone
+    # columns, which appending row by row could not extend. The schema is inferred
+    # from every row, not the first 100, so columns first seen late are kept
+    if all_activities_data:
+        # The analysis reads the last-3-days summary, a sync only fills the stores
+        if not args.sync:
+            activities_df = pl.DataFrame(all_activities_data, infer_schema_length=None)
+            activities_csv = 'src/export_data/data/activities_last_3_days.csv'
+            activities_df.write_csv(activities_csv)
+            print(f"\nSaved summary of all activities to {activities_csv}")
+        print(f"Total activities processed: {len(all_activities_data)}")
+
+        # Print some zone analysis summaries
+        for activity in all_activities_data:
+            print(f"\nActivity: {activity['name']} ({activity['sport_type']})")
+
+            if activity['has_hr_zones']:
+                print("  Heart Rate Zone Analysis (minutes):")
+                for key in sorted([k for k in activity.keys() if k.startswith('hr_') and k.endswith('_minutes')]):
+                    zone_name = key.replace('hr_', '').replace('_minutes', '').replace('_', ' ')
+                    print(f"    {zone_name.title()}: {activity[key]}")
+
+            if activity['has_power_zones']:
+                print("  Power Zone Analysis (minutes):")
+                for key in sorted([k for k in activity.keys() if k.startswith('power_') and k.endswith('_minutes')]):
+                    zone_name = key.replace('power_', '').replace('_minutes', '').replace('_', ' ')
+                    print(f"    {zone_name.title()}: {activity[key]}")
+    else:
+        print(f"No activities found {description}")
+
+    print("\nProcess completed!")
+
+if __name__ == "__main__":
+    main()
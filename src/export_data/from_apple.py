@@ -1,39 +1,75 @@
+import argparse
+import os
+import zipfile
+
 import polars as pl
 from icecream import ic
-import xml.etree.ElementTree as ET
-import os
 
-# Parse the XML file
-tree = ET.parse('src/export_data/data/export.xml')
-root = tree.getroot()
-
-
-# Extract sleep data
-sleep_data = []
-print("aa")
-# Define the health record types we want to extract
-health_record_types = [
-    'HKCategoryTypeIdentifierSleepAnalysis',
-    'HKQuantityTypeIdentifierHeartRateVariabilitySDNN',
-    'HKQuantityTypeIdentifierHeartRate'
-]
-
-# Use one loop to extract all types of health data
-for record_type in health_record_types:
-    for index, record in enumerate(root.findall(f".//Record[@type='{record_type}']")):
-        print(f"Processing {record_type} record {index}")
-        sleep_data.append({
-            'record_type': record_type,
-            'start_date': record.attrib.get('startDate'),
-            'end_date': record.attrib.get('endDate'),
-            'value': record.attrib.get('value'),
-            **record.attrib  # Append all attributes from the record
-        })
-
-print("aa")
-sleep_df = pl.DataFrame(sleep_data)
-
-# Export the sleep dataframe to a CSV file
-sleep_df.write_csv('src/export_data/data/sleep_data.csv')
-
-ic(sleep_df)
\ No newline at end of file
+from src.export_data.apple_health import (
+    extract_records, extract_records_parallel, load_config, open_export
+)
+from src.export_data.apple_store import (
+    STORE_DIR, append_records, high_water_marks, read_manifest
+)
+
+# Run from the repository root: python -m src.export_data.from_apple [--workers N]
+EXPORT_ZIP_PATH = 'src/export_data/data/export.zip'
+EXPORT_PATH = 'src/export_data/data/export.xml'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract Apple Health records into the Parquet store")
+    parser.add_argument('--export', default=EXPORT_ZIP_PATH if os.path.exists(EXPORT_ZIP_PATH) else EXPORT_PATH,
+                        help="path to the iPhone's export.zip or an unpacked export.xml")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="parse byte-range chunks of the export in this many processes")
+    args = parser.parse_args()
+
+    # The health record types to extract are defined in apple_health_config.json
+    config = load_config()
+
+    # Only keep records created after the newest one of their type already in the store,
+    # types without stored records are extracted in full
+    since = high_water_marks(read_manifest(STORE_DIR))
+    for record_type in config['record_types']:
+        if record_type in since:
+            print(f"Appending {record_type} records created after {since[record_type].isoformat()}")
+        else:
+            print(f"Extracting the full history of {record_type}")
+
+    # A compressed member cannot be split into byte ranges, zips are always parsed serially
+    is_zip = zipfile.is_zipfile(args.export)
+    if args.workers > 1 and is_zip:
+        print("Parallel parsing needs an unpacked export.xml, parsing the zip serially")
+
+    if args.workers > 1 and not is_zip:
+        # Chunks are parsed in a process pool and merged back in document order
+        frames = extract_records_parallel(
+            args.export, config['record_types'], args.workers, since=since
+        ).values()
+    else:
+        # One streaming pass over the export, each record goes to its type's sink
+        # The zip member is decompressed on the fly, nothing is unpacked to disk
+        with open_export(args.export) as source:
+            sinks = extract_records(
+                source,
+                config['record_types'],
+                progress_every=config.get('progress_every', 100_000),
+                since=since,
+            )
+        frames = [sink.to_frame() for sink in sinks.values()]
+
+    records_df = pl.concat(frames)
+    if records_df.is_empty():
+        print("No new records in the export")
+        return
+
+    # Write the typed records into the partitioned Parquet store
+    appended = append_records(records_df, STORE_DIR)
+    print(f"Appended {appended:,} records to {STORE_DIR}")
+
+    ic(records_df)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+CACHE_DIR = 'src/export_data/data/http_cache'
+# Entries not validated for this long are pruned, with the bodies no other entry uses
+PRUNE_AFTER_SECONDS = 30 * 24 * 60 * 60
+
+
+class CachedResponse:
+    """Stand-in for a requests.Response served from the on-disk cache"""
+
+    status_code = 200
+    from_cache = True
+
+    def __init__(self, content):
+        self.content = content
+        self.headers = {}
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Threads of the pooled client can write the same key at once
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache of GET responses.
+
+    Bodies are stored once under the SHA-256 of their content in blobs/, and
+    a small index entry per request (URL + params) keeps the ETag and
+    Last-Modified validators used for conditional requests. prune() drops
+    entries that were not validated recently, so keys that are never requested
+    again (activity lists with a moving ``after``) do not pile up.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+
+    def _entry_path(self, url, params):
+        request = json.dumps([url, sorted((params or {}).items())], default=str)
+        key = hashlib.sha256(request.encode()).hexdigest()
+        return self.cache_dir / 'index' / key[:2] / f"{key}.json"
+
+    def _blob_path(self, content_hash):
+        return self.cache_dir / 'blobs' / content_hash[:2] / content_hash
+
+    def load(self, url, params=None):
+        """Return the index entry of a cached request, or None"""
+        entry_path = self._entry_path(url, params)
+        if not entry_path.exists():
+            return None
+        with open(entry_path) as f:
+            entry = json.load(f)
+        if not self._blob_path(entry['content_hash']).exists():
+            return None
+        return entry
+
+    def conditional_headers(self, entry):
+        """Validators to send so the server can answer 304 Not Modified"""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def response(self, entry):
+        """Serve a cached entry as a response"""
+        with open(self._blob_path(entry['content_hash']), 'rb') as f:
+            return CachedResponse(f.read())
+
+    def store(self, url, params, response):
+        """Cache a 200 response with its validators"""
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        blob_path = self._blob_path(content_hash)
+        if not blob_path.exists():
+            _write_atomic(blob_path, response.content)
+        entry = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content_hash': content_hash,
+            'validated_at': time.time(),
+        }
+        _write_atomic(self._entry_path(url, params), json.dumps(entry).encode())
+
+    def revalidated(self, url, params, entry):
+        """Record that the server confirmed a cached entry is still current"""
+        entry['validated_at'] = time.time()
+        _write_atomic(self._entry_path(url, params), json.dumps(entry).encode())
+
+    def prune(self, max_age=PRUNE_AFTER_SECONDS):
+        """Remove entries not validated within max_age seconds and the bodies left unused"""
+        now = time.time()
+        removed = 0
+        used = set()
+        for entry_path in self.cache_dir.glob('index/*/*.json'):
+            with open(entry_path) as f:
+                entry = json.load(f)
+            if now - entry['validated_at'] > max_age:
+                entry_path.unlink()
+                removed += 1
+            else:
+                used.add(entry['content_hash'])
+        for blob_path in self.cache_dir.glob('blobs/*/*'):
+            if blob_path.name not in used:
+                blob_path.unlink()
+        return removed
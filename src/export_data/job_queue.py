@@ -0,0 +1,128 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+
+# Per-activity download jobs, their state and finished summary rows survive restarts
+QUEUE_PATH = 'src/export_data/data/strava_jobs.sqlite'
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def backoff_delay(attempts, base=2.0, cap=300.0):
+    """Full-jitter exponential backoff: a random delay up to base * 2^attempts seconds, capped"""
+    return random.uniform(0, min(cap, base * 2 ** attempts))
+
+
+class JobQueue:
+    """Persistent, thread-safe queue of per-activity jobs backed by SQLite.
+
+    Each job is pending, running, done or failed. A job's summary row is
+    stored in the same transaction that marks it done, so a crash never loses
+    finished work, along with the version (the zone config hash) it was
+    computed under. Jobs left running by a crash are put back to pending on
+    open, and failed attempts are retried after a jittered exponential
+    backoff until max_attempts is reached.
+    """
+
+    def __init__(self, path=QUEUE_PATH, max_attempts=5):
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                activity_id INTEGER PRIMARY KEY,
+                activity TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                error TEXT,
+                summary TEXT,
+                summary_version TEXT,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        columns = {row[1] for row in self._db.execute('PRAGMA table_info(jobs)')}
+        if 'summary_version' not in columns:
+            # Queues created before summaries were versioned
+            self._db.execute('ALTER TABLE jobs ADD COLUMN summary_version TEXT')
+        with self._db:
+            self._db.execute('UPDATE jobs SET state = ? WHERE state = ?', (PENDING, RUNNING))
+
+    def enqueue(self, activities, version=None):
+        """Add jobs for new activities.
+
+        Jobs that failed for good get a fresh set of attempts, and done jobs
+        whose summary was computed under another version than the given one
+        are run again.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany('''
+                INSERT INTO jobs (activity_id, activity, state, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (activity_id) DO UPDATE SET
+                    state = excluded.state, attempts = 0, next_attempt_at = 0, updated_at = excluded.updated_at
+                WHERE jobs.state = ? OR (jobs.state = ? AND ? IS NOT NULL AND jobs.summary_version IS NOT ?)
+            ''', [(activity['id'], json.dumps(activity), PENDING, now, FAILED, DONE, version, version)
+                  for activity in activities])
+
+    def claim(self):
+        """Take the next job that is due, waiting for deferred retries. Returns None once nothing is pending"""
+        while True:
+            with self._lock:
+                now = time.time()
+                row = self._db.execute('''
+                    SELECT activity_id, activity, next_attempt_at FROM jobs
+                    WHERE state = ? ORDER BY next_attempt_at, activity_id LIMIT 1
+                ''', (PENDING,)).fetchone()
+                if row is None:
+                    return None
+                activity_id, activity, next_attempt_at = row
+                if next_attempt_at <= now:
+                    with self._db:
+                        self._db.execute('UPDATE jobs SET state = ?, updated_at = ? WHERE activity_id = ?',
+                                         (RUNNING, now, activity_id))
+                    return json.loads(activity)
+                wait = next_attempt_at - now
+            time.sleep(wait)
+
+    def complete(self, activity_id, summary, version=None):
+        """Mark a job done and store its summary row with the version it was computed under"""
+        with self._lock, self._db:
+            self._db.execute('''
+                UPDATE jobs SET state = ?, summary = ?, summary_version = ?, error = NULL, updated_at = ?
+                WHERE activity_id = ?
+            ''', (DONE, json.dumps(summary), version, time.time(), activity_id))
+
+    def fail(self, activity_id, error):
+        """Record a failed attempt, rescheduling the job with backoff or giving up on it"""
+        with self._lock, self._db:
+            (attempts,) = self._db.execute('SELECT attempts FROM jobs WHERE activity_id = ?',
+                                           (activity_id,)).fetchone()
+            attempts += 1
+            now = time.time()
+            state = PENDING if attempts < self.max_attempts else FAILED
+            self._db.execute('''
+                UPDATE jobs SET state = ?, attempts = ?, next_attempt_at = ?, error = ?, updated_at = ?
+                WHERE activity_id = ?
+            ''', (state, attempts, now + backoff_delay(attempts), str(error), now, activity_id))
+        return state
+
+    def summaries(self, activity_ids):
+        """Stored summary rows of the finished jobs among the given activities, in the given order"""
+        with self._lock:
+            rows = dict(self._db.execute('SELECT activity_id, summary FROM jobs WHERE state = ?', (DONE,)))
+        return [json.loads(rows[activity_id]) for activity_id in activity_ids if activity_id in rows]
+
+    def counts(self):
+        """Number of jobs per state"""
+        with self._lock:
+            return dict(self._db.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state'))
+
+    def close(self):
+        self._db.close()
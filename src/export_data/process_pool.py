@@ -0,0 +1,11 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def spawn_pool(workers=None):
+    """Process pool whose workers are spawned rather than forked.
+
+    polars' thread pool does not survive a fork once the parent has used it,
+    forked workers can hang on their first polars call.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
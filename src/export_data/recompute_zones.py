@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+from pathlib import Path
+
+from src.export_data.process_pool import spawn_pool
+from src.export_data.strava_streams import read_streams, recorded_channels
+from src.export_data.zones import (
+    CYCLING_SPORT_TYPES,
+    ZONES_CONFIG_PATH,
+    calculate_hr_zones,
+    calculate_power_zones,
+    load_zone_config,
+    thresholds_for,
+    time_in_zones_batch,
+)
+
+# Run from the repository root: python -m src.export_data.recompute_zones [--config PATH] [--workers N]
+# Rewrites the zone files of every downloaded activity from its saved streams, without any request to Strava
+DETAILED_ACTIVITIES_DIR = 'src/export_data/data/detailed_activities'
+
+
+def downloaded_activities(detailed_dir):
+    """(activity_id, sport_type, start_date) of every downloaded activity"""
+    activities = []
+    for detail_file in sorted(Path(detailed_dir).glob('activity_*.json')):
+        activity_id = detail_file.stem.replace('activity_', '')
+        if not activity_id.isdigit():
+            continue
+        with open(detail_file) as f:
+            details = json.load(f)
+        activities.append((activity_id, details.get('sport_type'), details['start_date']))
+    return activities
+
+
+def _write_zones(path, zone_data):
+    if zone_data:
+        with open(path, 'w') as f:
+            json.dump(zone_data, f)
+    elif os.path.exists(path):
+        # Zones the activity no longer has, e.g. a sport type without power zones
+        os.remove(path)
+
+
+def recompute_chunk(task):
+    """Recompute and rewrite the zone files of a chunk of activities, returns how many had streams.
+
+    Activities sharing the same thresholds are binned in one batch call.
+    """
+    detailed_dir, activities, config = task
+
+    groups = {}
+    for activity_id, sport_type, start_date in activities:
+        frame = read_streams(detailed_dir, activity_id)
+        if frame is None:
+            continue
+        groups.setdefault(thresholds_for(config, start_date), []).append(
+            (activity_id, sport_type, recorded_channels(frame))
+        )
+
+    for (hr_max, ftp), members in groups.items():
+        stream_data = [channels for _, _, channels in members]
+        hr_results = time_in_zones_batch(stream_data, calculate_hr_zones(hr_max), 'heartrate')
+        power_results = time_in_zones_batch(stream_data, calculate_power_zones(ftp), 'watts')
+
+        for (activity_id, sport_type, _), hr_zone_data, power_zone_data in zip(members, hr_results, power_results):
+            if sport_type not in CYCLING_SPORT_TYPES:
+                power_zone_data = None
+            _write_zones(os.path.join(detailed_dir, f"activity_{activity_id}_hr_zones.json"), hr_zone_data)
+            _write_zones(os.path.join(detailed_dir, f"activity_{activity_id}_power_zones.json"), power_zone_data)
+
+    return sum(len(members) for members in groups.values())
+
+
+def recompute_zones(detailed_dir=DETAILED_ACTIVITIES_DIR, config=None, workers=None, chunk_size=64):
+    """Recompute the zone files of all downloaded activities over a process pool"""
+    config = config or load_zone_config()
+    activities = downloaded_activities(detailed_dir)
+    tasks = [
+        (detailed_dir, activities[i:i + chunk_size], config)
+        for i in range(0, len(activities), chunk_size)
+    ]
+    with spawn_pool(workers) as pool:
+        recomputed = sum(pool.map(recompute_chunk, tasks))
+    return len(activities), recomputed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute HR and power zone files from cached streams")
+    parser.add_argument('--config', default=ZONES_CONFIG_PATH, help="HR max and FTP history")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes, defaults to one per CPU")
+    args = parser.parse_args()
+
+    total, recomputed = recompute_zones(config=load_zone_config(args.config), workers=args.workers)
+    print(f"Recomputed zones for {recomputed} of {total} activities in {DETAILED_ACTIVITIES_DIR}")
+
+
+if __name__ == "__main__":
+    main()
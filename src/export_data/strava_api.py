@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.export_data.strava_streams import STREAM_KEYS
+
+# Point STRAVA_API_URL at a local stand-in server to exercise the client without Strava
+STRAVA_API_URL = os.getenv('STRAVA_API_URL', 'https://www.strava.com/api/v3')
+
+# Strava's default application quota: 200 requests per 15 minutes, 2000 per day
+DEFAULT_LIMITS = (200, 2000)
+WINDOW_SECONDS = 15 * 60
+DAY_SECONDS = 24 * 60 * 60
+
+
+def seconds_until_window_reset():
+    """Strava's 15-minute windows reset at :00, :15, :30 and :45 UTC"""
+    return WINDOW_SECONDS - time.time() % WINDOW_SECONDS
+
+
+def seconds_until_day_reset():
+    """The daily quota resets at midnight UTC"""
+    return DAY_SECONDS - time.time() % DAY_SECONDS
+
+
+def parse_quota(headers):
+    """Return ((15-min limit, daily limit), (15-min usage, daily usage)) from response headers.
+
+    Strava reports the overall quota in X-RateLimit-* and, for newer
+    applications, a tighter read quota in X-ReadRateLimit-*. The tighter
+    remaining quota of the two wins.
+    """
+    quotas = []
+    for prefix in ('X-RateLimit', 'X-ReadRateLimit'):
+        limit = headers.get(f'{prefix}-Limit')
+        usage = headers.get(f'{prefix}-Usage')
+        if limit and usage:
+            quotas.append((
+                tuple(int(x) for x in limit.split(',')),
+                tuple(int(x) for x in usage.split(',')),
+            ))
+    if not quotas:
+        return None
+    return min(quotas, key=lambda quota: (quota[0][0] - quota[1][0], quota[0][1] - quota[1][1]))
+
+
+class RateLimiter:
+    """Thread-safe token bucket pacing requests to Strava's 15-minute and daily quotas.
+
+    The bucket refills continuously at limit / 15 minutes and is resynchronised
+    with the X-RateLimit-Limit / X-RateLimit-Usage headers of every response,
+    so requests made by other clients of the same application count too.
+    """
+
+    def __init__(self, limits=DEFAULT_LIMITS):
+        self.short_limit, self.daily_limit = limits
+        self.tokens = float(self.short_limit)
+        self.daily_remaining = self.daily_limit
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.short_limit, self.tokens + (now - self._updated) * self.short_limit / WINDOW_SECONDS)
+        self._updated = now
+
+    def _block_for(self, seconds):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._blocked_until and self.tokens >= 1 and self.daily_remaining > 0:
+                    self.tokens -= 1
+                    self.daily_remaining -= 1
+                    return
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self.daily_remaining <= 0:
+                    wait = seconds_until_day_reset()
+                else:
+                    wait = (1 - self.tokens) * WINDOW_SECONDS / self.short_limit
+            time.sleep(wait)
+
+    def update(self, headers):
+        """Resynchronise the bucket with the quota usage reported by Strava"""
+        quota = parse_quota(headers)
+        if quota is None:
+            return
+        (short_limit, daily_limit), (short_usage, daily_usage) = quota
+        with self._lock:
+            self._refill(time.monotonic())
+            self.short_limit, self.daily_limit = short_limit, daily_limit
+            self.tokens = max(0.0, min(self.tokens, short_limit - short_usage))
+            self.daily_remaining = daily_limit - daily_usage
+            if short_usage >= short_limit:
+                self._block_for(seconds_until_window_reset())
+            if daily_usage >= daily_limit:
+                self._block_for(seconds_until_day_reset())
+
+    def back_off(self):
+        """Stop sending after a 429 until the current 15-minute window resets"""
+        with self._lock:
+            self.tokens = 0.0
+            self._block_for(seconds_until_window_reset())
+
+
+class StravaClient:
+    """Strava API client that paces every request through a shared RateLimiter.
+
+    All requests go through one pooled keep-alive session, so connections and
+    TLS sessions are reused. With a ResponseCache, cached responses are
+    revalidated with conditional requests (a 304 costs no payload) or, when
+    younger than ``cache_max_age`` seconds, served without any request.
+    Safe to use from several threads at once.
+    """
+
+    def __init__(self, access_token, base_url=STRAVA_API_URL, rate_limiter=None, max_retries=3,
+                 pool_size=8, cache=None, cache_max_age=0):
+        self.access_token = access_token
+        self.base_url = base_url.rstrip('/')
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_retries = max_retries
+        self.cache = cache
+        self.cache_max_age = cache_max_age
+
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Bearer {access_token}'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get(self, path, params=None, cached=True):
+        """GET an API path, retrying after the window resets when rate limited.
+
+        With cached=False the response cache is neither read nor written.
+        """
+        url = f"{self.base_url}{path}"
+        headers = {}
+        cache = self.cache if cached else None
+
+        entry = cache.load(url, params) if cache else None
+        if entry:
+            if time.time() - entry['validated_at'] < self.cache_max_age:
+                return cache.response(entry)
+            headers.update(cache.conditional_headers(entry))
+
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            response = self.session.get(url, headers=headers, params=params, timeout=30)
+            self.rate_limiter.update(response.headers)
+            if response.status_code == 304 and entry:
+                cache.revalidated(url, params, entry)
+                return cache.response(entry)
+            if response.status_code == 200 and cache:
+                cache.store(url, params, response)
+            if response.status_code != 429:
+                return response
+            print(f"Rate limited on {path}, waiting for the quota window to reset (attempt {attempt + 1})")
+            self.rate_limiter.back_off()
+        return response
+
+    def list_activities(self, **params):
+        """Get one page of the athlete's activities"""
+        response = self.get('/athlete/activities', params=params)
+        if response.status_code == 200:
+            return response.json()
+        print(f"Error fetching activities: {response.status_code}")
+        return []
+
+    def iter_activities(self, per_page=200, **params):
+        """Yield the athlete's activities page by page until the list is exhausted"""
+        page = 1
+        while True:
+            activities = self.list_activities(page=page, per_page=per_page, **params)
+            yield from activities
+            if len(activities) < per_page:
+                return
+            page += 1
+
+    def get_activity_details(self, activity_id):
+        """Get detailed information for a specific activity"""
+        response = self.get(f'/activities/{activity_id}')
+        if response.status_code == 200:
+            return response.json()
+        print(f"Error fetching activity {activity_id}: {response.status_code}")
+        return None
+
+    def get_activity_streams(self, activity_id):
+        """Get detailed stream data for a specific activity"""
+        params = {
+            'keys': STREAM_KEYS,
+            'key_by_type': True
+        }
+        # Not cached, the streams are kept in the stream store once downloaded
+        response = self.get(f'/activities/{activity_id}/streams', params=params, cached=False)
+        if response.status_code == 200:
+            return response.json()
+        print(f"Error fetching streams for activity {activity_id}: {response.status_code}")
+        return None
@@ -0,0 +1,91 @@
+import json
+import os
+
+import polars as pl
+
+# Stream channels requested from Strava, `latlng` is stored as separate latitude/longitude columns
+STREAM_KEYS = 'time,distance,latlng,altitude,velocity_smooth,heartrate,cadence,watts,temp,moving'
+
+# Fixed, typed column layout of every per-activity stream file, channels an
+# activity was not recorded with are all null
+STREAM_SCHEMA = {
+    'time': pl.Int64,
+    'distance': pl.Float64,
+    'heartrate': pl.Int32,
+    'watts': pl.Int32,
+    'cadence': pl.Int32,
+    'velocity_smooth': pl.Float64,
+    'altitude': pl.Float64,
+    'temp': pl.Int32,
+    'latitude': pl.Float64,
+    'longitude': pl.Float64,
+}
+
+
+def streams_path(output_dir, activity_id):
+    """Path of an activity's stream file"""
+    return os.path.join(output_dir, f"activity_{activity_id}_streams.parquet")
+
+
+def legacy_streams_paths(output_dir, activity_id):
+    """Raw JSON and CSV stream files written by earlier versions of the downloader"""
+    return (os.path.join(output_dir, f"activity_{activity_id}_streams.json"),
+            os.path.join(output_dir, f"activity_{activity_id}_streams.csv"))
+
+
+def streams_frame(streams):
+    """Build the typed stream frame from a Strava key_by_type streams response.
+
+    Returns None when the activity has no time stream.
+    """
+    stream_data = {key: data['data'] for key, data in streams.items() if 'data' in data}
+    if 'time' not in stream_data:
+        return None
+    length = len(stream_data['time'])
+
+    if 'latlng' in stream_data:
+        latlng = pl.Series('latlng', stream_data['latlng'], dtype=pl.List(pl.Float64))
+        stream_data['latitude'] = latlng.list.get(0, null_on_oob=True)
+        stream_data['longitude'] = latlng.list.get(1, null_on_oob=True)
+
+    columns = []
+    for name, dtype in STREAM_SCHEMA.items():
+        if name in stream_data:
+            # Strava sends integer channels as JSON numbers, go through Float64 to accept either
+            columns.append(pl.Series(name, stream_data[name], dtype=pl.Float64, strict=False).cast(dtype))
+        else:
+            columns.append(pl.repeat(None, length, dtype=dtype, eager=True).alias(name))
+    return pl.DataFrame(columns)
+
+
+def write_streams(frame, path):
+    """Write a stream frame, the file only appears once it is complete"""
+    tmp_path = f"{path}.tmp"
+    frame.write_parquet(tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+
+def read_streams(output_dir, activity_id):
+    """Read an activity's typed stream frame, or None if it has no streams.
+
+    Activities downloaded before the Parquet stream files are converted from
+    their raw JSON streams on the fly.
+    """
+    path = streams_path(output_dir, activity_id)
+    if os.path.exists(path):
+        return pl.read_parquet(path)
+
+    json_path, _ = legacy_streams_paths(output_dir, activity_id)
+    if os.path.exists(json_path):
+        with open(json_path) as f:
+            return streams_frame(json.load(f))
+    return None
+
+
+def recorded_channels(frame):
+    """Channels of a stream frame holding at least one sample, as NumPy arrays (nulls become NaN)"""
+    return {
+        name: frame[name].to_numpy()
+        for name in frame.columns
+        if frame[name].null_count() < frame.height
+    }
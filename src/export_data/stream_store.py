@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+
+from src.export_data.strava_streams import STREAM_SCHEMA, read_streams
+
+# Run from the repository root: python -m src.export_data.stream_store
+# Parquet dataset of every activity's streams laid out as
+# sport_type=<type>/month=<YYYY-MM>/part-*.parquet, rows sorted by activity_id and time
+STORE_DIR = 'src/export_data/data/strava_streams'
+INDEX_NAME = 'index.json'
+DETAILED_ACTIVITIES_DIR = 'src/export_data/data/detailed_activities'
+
+STORE_SCHEMA = {'activity_id': pl.Int64, **STREAM_SCHEMA}
+PARTITION_SCHEMA = {'sport_type': pl.String, 'month': pl.String}
+
+# Small row groups so reading one activity's row range only decodes the groups it spans
+ROW_GROUP_SIZE = 65_536
+# Activities read per consolidation batch, each batch rewrites the month partitions it touches once
+BATCH_SIZE = 500
+
+
+def read_index(store_dir=STORE_DIR):
+    """Return the activity index, or an empty one for a new store.
+
+    The index maps every activity_id to its partition, part file, row offset
+    and row count, plus its sport type and start date.
+    """
+    index_path = Path(store_dir) / INDEX_NAME
+    if not index_path.exists():
+        return {'activities': {}}
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def write_index(index, store_dir=STORE_DIR):
+    """Atomically replace the activity index"""
+    index_path = Path(store_dir) / INDEX_NAME
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+
+
+def _start_datetime(start_date):
+    return datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+
+
+def append_activities(activities, store_dir=STORE_DIR):
+    """Add (details, stream frame) pairs to the store and index their row ranges.
+
+    Each month partition an activity lands in is rewritten as one part file
+    holding its stored rows and the new ones, sorted by activity_id and time,
+    so nightly appends do not pile up small files. The parts it replaces are
+    deleted once the index points at the new file. Activities already in the
+    index are skipped. Returns the number added.
+    """
+    index = read_index(store_dir)
+    part_name = f"part-{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+
+    partitions = {}
+    for details, frame in activities:
+        activity_id = str(details['id'])
+        if activity_id in index['activities'] or frame is None:
+            continue
+        month = details['start_date'][:7]
+        partition = f"sport_type={details.get('sport_type')}/month={month}"
+        partitions.setdefault(partition, {})[activity_id] = (details, frame)
+
+    replaced = set()
+    added = 0
+    for partition, members in partitions.items():
+        part_dir = Path(store_dir) / partition
+        part_dir.mkdir(parents=True, exist_ok=True)
+        stored = {activity_id: entry for activity_id, entry in index['activities'].items()
+                  if entry['partition'] == partition}
+        stored_files = sorted({part_dir / entry['file'] for entry in stored.values()})
+
+        frames = [pl.read_parquet(path).select(STORE_SCHEMA.keys()) for path in stored_files]
+        frames += [
+            frame.sort('time').select(pl.lit(details['id'], dtype=pl.Int64).alias('activity_id'), pl.all())
+            for details, frame in members.values()
+        ]
+        # Stored rows are already in time order per activity, a stable sort on the ID keeps it
+        rows = pl.concat([frame.cast(STORE_SCHEMA) for frame in frames]).sort('activity_id', maintain_order=True)
+        rows.write_parquet(part_dir / part_name, row_group_size=ROW_GROUP_SIZE)
+
+        offset = 0
+        for activity_id, length in rows.group_by('activity_id', maintain_order=True).len().iter_rows():
+            activity_id = str(activity_id)
+            if activity_id in members:
+                details = members[activity_id][0]
+                entry = {'sport_type': details.get('sport_type'), 'start_date': details['start_date']}
+                added += 1
+            else:
+                entry = stored[activity_id]
+            index['activities'][activity_id] = {
+                'partition': partition,
+                'file': part_name,
+                'offset': offset,
+                'length': length,
+                'sport_type': entry['sport_type'],
+                'start_date': entry['start_date'],
+            }
+            offset += length
+        replaced.update(stored_files)
+
+    # The index is only written once every part file is complete, the parts it
+    # no longer references are removed after that
+    if added:
+        write_index(index, store_dir)
+        for path in replaced:
+            path.unlink(missing_ok=True)
+    return added
+
+
+def read_activity(activity_id, store_dir=STORE_DIR):
+    """Read one activity's streams by seeking to its row range, or None if not stored"""
+    entry = read_index(store_dir)['activities'].get(str(activity_id))
+    if entry is None:
+        return None
+    path = Path(store_dir) / entry['partition'] / entry['file']
+    return pl.scan_parquet(path).slice(entry['offset'], entry['length']).collect()
+
+
+def select_activities(index, sport_types=None, start=None, end=None, activity_ids=None):
+    """Index entries of the activities of the given sport types starting in [start, end)"""
+    selected = {}
+    for activity_id, entry in index['activities'].items():
+        if activity_ids is not None and activity_id not in activity_ids:
+            continue
+        if sport_types and entry['sport_type'] not in sport_types:
+            continue
+        started = _start_datetime(entry['start_date'])
+        if (start and started < start) or (end and started >= end):
+            continue
+        selected[activity_id] = entry
+    return selected
+
+
+def scan_streams(store_dir=STORE_DIR, sport_types=None, start=None, end=None, activity_ids=None):
+    """Lazily scan the streams of the selected activities.
+
+    Only the part files the index lists for them are opened, no directory is
+    walked. start and end are timezone-aware datetimes bounding the activity
+    start date, activity_ids an optional collection of IDs (as strings).
+    """
+    if activity_ids is not None:
+        activity_ids = set(activity_ids)
+    selected = select_activities(read_index(store_dir), sport_types, start, end, activity_ids)
+    paths = sorted({str(Path(store_dir) / entry['partition'] / entry['file']) for entry in selected.values()})
+    if not paths:
+        return pl.LazyFrame(schema={**STORE_SCHEMA, **PARTITION_SCHEMA})
+
+    streams = pl.scan_parquet(paths, hive_partitioning=True, hive_schema=PARTITION_SCHEMA)
+    if start or end or activity_ids is not None:
+        # Part files hold a month of activities, drop the ones not selected
+        streams = streams.filter(pl.col('activity_id').is_in([int(activity_id) for activity_id in selected]))
+    return streams
+
+
+def consolidate(detailed_dir=DETAILED_ACTIVITIES_DIR, store_dir=STORE_DIR):
+    """Add every downloaded activity that is not in the store yet"""
+    indexed = read_index(store_dir)['activities']
+    pending = []
+    for detail_file in sorted(Path(detailed_dir).glob('activity_*.json')):
+        activity_id = detail_file.stem.replace('activity_', '')
+        if not activity_id.isdigit() or activity_id in indexed:
+            continue
+        pending.append((detail_file, activity_id))
+
+    added = 0
+    for batch_start in range(0, len(pending), BATCH_SIZE):
+        batch = []
+        for detail_file, activity_id in pending[batch_start:batch_start + BATCH_SIZE]:
+            with open(detail_file) as f:
+                details = json.load(f)
+            batch.append((details, read_streams(detailed_dir, activity_id)))
+        added += append_activities(batch, store_dir)
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consolidate downloaded activity streams into one indexed dataset")
+    parser.add_argument('--rebuild', action='store_true', help="discard the index and consolidate every activity again")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        index_path = Path(STORE_DIR) / INDEX_NAME
+        if index_path.exists():
+            index_path.unlink()
+        for part in Path(STORE_DIR).glob('sport_type=*/month=*/*.parquet'):
+            part.unlink()
+
+    added = consolidate()
+    total = len(read_index()['activities'])
+    print(f"Consolidated {added} new activities, {total} activities in {STORE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
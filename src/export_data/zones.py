@@ -0,0 +1,122 @@
+import hashlib
+import json
+
+import numpy as np
+
+# Threshold history: the HR max, FTP and resting HR that applied from each date on
+ZONES_CONFIG_PATH = 'src/export_data/strava_zones_config.json'
+
+# Sport types power zones are computed for
+CYCLING_SPORT_TYPES = ('Ride', 'VirtualRide')
+
+
+def load_zone_config(path=ZONES_CONFIG_PATH):
+    """Load the HR max, FTP and resting HR history"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def zone_config_version(config):
+    """Hash of a zone config, results computed under another config are stale"""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+def threshold_on(history, day):
+    """Value of a threshold history on a day (YYYY-MM-DD), the earliest entry before the history starts"""
+    entries = sorted(history, key=lambda entry: entry['from'])
+    value = entries[0]['value']
+    for entry in entries:
+        if entry['from'] > day:
+            break
+        value = entry['value']
+    return value
+
+
+def thresholds_for(config, start_date):
+    """(HR max, FTP) that applied when an activity started"""
+    day = start_date[:10]
+    return threshold_on(config['hr_max'], day), threshold_on(config['ftp'], day)
+
+
+# Define heart rate zones (adjust according to your personal zones)
+def calculate_hr_zones(max_hr):
+    """Calculate heart rate zones based on max heart rate"""
+    return {
+        'Zone 1 (Recovery)': (0, int(max_hr * 0.6)),
+        'Zone 2 (Endurance)': (int(max_hr * 0.6), int(max_hr * 0.7)),
+        'Zone 3 (Tempo)': (int(max_hr * 0.7), int(max_hr * 0.8)),
+        'Zone 4 (Threshold)': (int(max_hr * 0.8), int(max_hr * 0.9)),
+        'Zone 5 (VO2 Max)': (int(max_hr * 0.9), int(max_hr * 1.0))
+    }
+
+# Define power zones (adjust according to your FTP)
+def calculate_power_zones(ftp):
+    """Calculate power zones based on FTP"""
+    return {
+        'Zone 1 (Active Recovery)': (0, int(ftp * 0.55)),
+        'Zone 2 (Endurance)': (int(ftp * 0.55), int(ftp * 0.75)),
+        'Zone 3 (Tempo)': (int(ftp * 0.75), int(ftp * 0.9)),
+        'Zone 4 (Threshold)': (int(ftp * 0.9), int(ftp * 1.05)),
+        'Zone 5 (VO2 Max)': (int(ftp * 1.05), int(ftp * 1.2)),
+        'Zone 6 (Anaerobic)': (int(ftp * 1.2), int(ftp * 1.5)),
+        'Zone 7 (Neuromuscular)': (int(ftp * 1.5), float('inf'))
+    }
+
+
+def sample_durations(times):
+    """Seconds each sample lasts: the gap to the next sample, the mean gap for the last one"""
+    times = np.asarray(times, dtype=np.float64)
+    if len(times) < 2:
+        return np.zeros(len(times))
+    gaps = np.diff(times)
+    return np.append(gaps, gaps.mean())
+
+
+def time_in_zones_batch(activities, zones, metric):
+    """Time spent in each zone for a batch of activities' stream data, in one pass.
+
+    Every sample of every activity is binned at once: searchsorted finds each
+    value's zone and a bincount weighted by the sample durations sums the
+    time per (activity, zone). Missing samples (None) are masked out, as are
+    values outside every zone. Returns one {zone: seconds} dict per activity,
+    or None for activities without the metric or a time stream.
+    """
+    names = sorted(zones, key=lambda name: zones[name][0])
+    lower = np.array([zones[name][0] for name in names], dtype=np.float64)
+    upper = np.array([zones[name][1] for name in names], dtype=np.float64)
+
+    present = [i for i, stream_data in enumerate(activities)
+               if metric in stream_data and 'time' in stream_data]
+    values = [np.asarray(activities[i][metric], dtype=np.float64) for i in present]
+    durations = [sample_durations(activities[i]['time']) for i in present]
+
+    results = [None] * len(activities)
+    if not present:
+        return results
+
+    lengths = [len(v) for v in values]
+    values = np.concatenate(values)
+    durations = np.concatenate(durations)
+    owner = np.repeat(np.arange(len(present)), lengths)
+
+    # A value belongs to the zone with the highest lower bound <= value, if below its upper bound
+    zone = np.searchsorted(lower, values, side='right') - 1
+    valid = ~np.isnan(values) & (zone >= 0)
+    valid[valid] &= values[valid] < upper[zone[valid]]
+
+    totals = np.bincount(
+        owner[valid] * len(names) + zone[valid],
+        weights=durations[valid],
+        minlength=len(present) * len(names),
+    ).reshape(len(present), len(names))
+
+    for row, i in enumerate(present):
+        # Report zones in their configured order
+        results[i] = {name: float(totals[row, names.index(name)]) for name in zones}
+    return results
+
+
+# Calculate time in zones from stream data
+def calculate_time_in_zones(stream_data, zones, metric):
+    """Calculate time spent in each zone"""
+    return time_in_zones_batch([stream_data], zones, metric)[0]
@@ -0,0 +1,18 @@
+import pytest
+
+from tests.fake_strava import FakeStrava
+
+
+@pytest.fixture
+def fake_strava():
+    """Start FakeStrava servers with the given options, stopped after the test"""
+    servers = []
+
+    def start(**kwargs):
+        server = FakeStrava(**kwargs).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeStrava:
+    """Threaded stand-in for the Strava API on a local port.
+
+    Serves /athlete/activities (paged by page and per_page),
+    /activities/<id> and /activities/<id>/streams for a number of generated
+    activities. Every response reports the quota in X-RateLimit-Limit and
+    X-RateLimit-Usage, usage counting up from ``usage`` with each request. The
+    first ``rate_limited`` requests are answered with a 429. Bodies carry an
+    ETag and requests whose If-None-Match matches it get a 304. Requests are
+    logged as (path, query) in ``requests`` and response codes in ``statuses``.
+    """
+
+    def __init__(self, activities=0, limits=(200, 2000), usage=(0, 0), rate_limited=0):
+        self.activities = [
+            {'id': 1000 + i, 'name': f"Ride {i}", 'sport_type': 'Ride', 'start_date': f"2025-03-{1 + i % 28:02d}T07:00:00Z"}
+            for i in range(activities)
+        ]
+        self.limits = limits
+        self.usage = list(usage)
+        self.rate_limited = rate_limited
+        self.requests = []
+        self.statuses = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def respond(self, path, query):
+        """Status and JSON body of a request, counting it against the quota"""
+        with self._lock:
+            self.requests.append((path, query))
+            self.usage = [self.usage[0] + 1, self.usage[1] + 1]
+            if self.rate_limited > 0:
+                self.rate_limited -= 1
+                return 429, {'message': 'Rate Limit Exceeded'}
+
+        if path == '/athlete/activities':
+            page = int(query.get('page', ['1'])[0])
+            per_page = int(query.get('per_page', ['30'])[0])
+            return 200, self.activities[(page - 1) * per_page:page * per_page]
+        parts = path.strip('/').split('/')
+        if parts[0] == 'activities' and len(parts) >= 2 and parts[1].isdigit():
+            activity = next((a for a in self.activities if a['id'] == int(parts[1])), None)
+            if activity is None:
+                return 404, {'message': 'Record Not Found'}
+            if len(parts) == 3 and parts[2] == 'streams':
+                return 200, {'time': {'data': list(range(60))}, 'watts': {'data': [200] * 60}}
+            return 200, activity
+        return 404, {'message': 'Record Not Found'}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                status, body = fake.respond(url.path, parse_qs(url.query))
+                payload = json.dumps(body).encode()
+                etag = f'"{hashlib.md5(payload).hexdigest()}"'
+                if status == 200 and self.headers.get('If-None-Match') == etag:
+                    status, payload = 304, b''
+                fake.statuses.append(status)
+                self.send_response(status)
+                if status in (200, 304):
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.send_header('X-RateLimit-Limit', f"{fake.limits[0]},{fake.limits[1]}")
+                self.send_header('X-RateLimit-Usage', f"{fake.usage[0]},{fake.usage[1]}")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
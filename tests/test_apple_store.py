@@ -0,0 +1,63 @@
+import io
+from datetime import datetime, timezone
+
+import polars as pl
+
+from src.export_data.apple_health import extract_records
+from src.export_data.apple_store import append_records, high_water_marks, read_manifest, scan_records, write_manifest
+
+HEART_RATE = 'HKQuantityTypeIdentifierHeartRate'
+STEPS = 'HKQuantityTypeIdentifierStepCount'
+
+
+def record(record_type, created, value, start='2025-03-20 07:00:00 +0000'):
+    creation = f' creationDate="{created}"' if created else ''
+    return (f'<Record type="{record_type}" sourceName="Watch" unit="count/min"{creation} '
+            f'startDate="{start}" endDate="{start}" value="{value}"/>')
+
+
+def export(*records):
+    return io.BytesIO(f'<?xml version="1.0"?><HealthData locale="en">{"".join(records)}</HealthData>'.encode())
+
+
+def extract_and_append(source, record_types, store_dir):
+    """One incremental run: extract what is newer than each type's mark and append it"""
+    since = high_water_marks(read_manifest(store_dir))
+    sinks = extract_records(source, record_types, progress_every=0, since=since)
+    return append_records(pl.concat([sink.to_frame() for sink in sinks.values()]), store_dir)
+
+
+def test_incremental_runs_only_append_newer_records(tmp_path):
+    first = [record(HEART_RATE, '2025-03-20 08:00:00 +0000', 60), record(HEART_RATE, '2025-03-21 08:00:00 +0000', 62)]
+    later = [record(HEART_RATE, '2025-03-22 08:00:00 +0000', 64)]
+
+    assert extract_and_append(export(*first), [HEART_RATE], tmp_path) == 2
+    # The next export still holds every earlier record
+    assert extract_and_append(export(*first, *later), [HEART_RATE], tmp_path) == 1
+    assert extract_and_append(export(*first, *later), [HEART_RATE], tmp_path) == 0
+
+    assert high_water_marks(read_manifest(tmp_path)) == {HEART_RATE: datetime(2025, 3, 22, 8, tzinfo=timezone.utc)}
+    assert sorted(scan_records(tmp_path).collect()['value']) == [60, 62, 64]
+
+
+def test_type_added_later_gets_its_full_history(tmp_path):
+    records = [record(HEART_RATE, '2025-03-22 08:00:00 +0000', 60), record(STEPS, '2025-01-05 08:00:00 +0000', 500)]
+    extract_and_append(export(*records), [HEART_RATE], tmp_path)
+
+    # Steps were created before the heart rate mark, they must not be filtered by it
+    assert extract_and_append(export(*records), [HEART_RATE, STEPS], tmp_path) == 1
+    assert set(high_water_marks(read_manifest(tmp_path))) == {HEART_RATE, STEPS}
+
+
+def test_records_without_creation_date_do_not_move_the_mark(tmp_path):
+    assert extract_and_append(export(record(HEART_RATE, None, 60)), [HEART_RATE], tmp_path) == 1
+    assert high_water_marks(read_manifest(tmp_path)) == {}
+
+
+def test_legacy_store_wide_mark_applies_to_stored_types(tmp_path):
+    extract_and_append(export(record(HEART_RATE, '2025-03-22 08:00:00 +0000', 60)), [HEART_RATE], tmp_path)
+    manifest = read_manifest(tmp_path)
+    manifest['high_water_mark'] = manifest.pop('high_water_marks')[HEART_RATE]
+    write_manifest(manifest, tmp_path)
+
+    assert high_water_marks(read_manifest(tmp_path)) == {HEART_RATE: datetime(2025, 3, 22, 8, tzinfo=timezone.utc)}
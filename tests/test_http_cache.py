@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+
+from src.export_data.http_cache import ResponseCache
+from src.export_data.strava_api import StravaClient
+
+
+def client_for(server, cache, **kwargs):
+    return StravaClient('test-token', base_url=server.url, cache=cache, **kwargs)
+
+
+def cache_files(cache, kind):
+    return sorted(path for path in cache.cache_dir.glob(f'{kind}/*/*'))
+
+
+def test_unchanged_response_is_revalidated_with_a_304(fake_strava, tmp_path):
+    server = fake_strava(activities=1)
+    client = client_for(server, ResponseCache(tmp_path))
+
+    first = client.get_activity_details(1000)
+    second = client.get_activity_details(1000)
+
+    assert second == first
+    assert server.statuses == [200, 304]
+
+
+def test_changed_response_replaces_the_cached_body(fake_strava, tmp_path):
+    server = fake_strava(activities=1)
+    client = client_for(server, ResponseCache(tmp_path))
+
+    client.get_activity_details(1000)
+    server.activities[0]['name'] = 'Renamed'
+    details = client.get_activity_details(1000)
+
+    assert details['name'] == 'Renamed'
+    assert server.statuses == [200, 200]
+    assert client.get_activity_details(1000)['name'] == 'Renamed'
+
+
+def test_fresh_entries_are_served_without_a_request(fake_strava, tmp_path):
+    server = fake_strava(activities=1)
+    client = client_for(server, ResponseCache(tmp_path), cache_max_age=60)
+
+    client.get_activity_details(1000)
+    assert client.get_activity_details(1000)['id'] == 1000
+    assert len(server.requests) == 1
+
+
+def test_streams_are_not_cached(fake_strava, tmp_path):
+    server = fake_strava(activities=1)
+    cache = ResponseCache(tmp_path)
+    client = client_for(server, cache)
+
+    client.get_activity_streams(1000)
+    client.get_activity_streams(1000)
+
+    assert server.statuses == [200, 200]
+    assert cache_files(cache, 'index') == []
+
+
+def test_prune_drops_stale_entries_and_unused_bodies(fake_strava, tmp_path):
+    server = fake_strava(activities=2)
+    cache = ResponseCache(tmp_path)
+    client = client_for(server, cache)
+    client.get_activity_details(1000)
+    client.get_activity_details(1001)
+
+    # Age the entry of the first activity past the prune horizon
+    url = f"{server.url}/activities/1000"
+    entry = cache.load(url)
+    entry['validated_at'] = time.time() - 3600
+    cache._entry_path(url, None).write_text(json.dumps(entry))
+
+    assert cache.prune(max_age=60) == 1
+    assert cache.load(url) is None
+    assert cache.load(f"{server.url}/activities/1001") is not None
+    assert len(cache_files(cache, 'blobs')) == 1
+
+
+def test_threads_storing_the_same_key_do_not_collide(fake_strava, tmp_path):
+    server = fake_strava(activities=1)
+    cache = ResponseCache(tmp_path)
+    url = f"{server.url}/activities/1000"
+    response = StravaClient('test-token', base_url=server.url).get('/activities/1000')
+    errors = []
+
+    def store():
+        try:
+            for _ in range(20):
+                cache.store(url, None, response)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=store) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert list(tmp_path.rglob('*.tmp')) == []
+    assert cache.response(cache.load(url)).json() == response.json()
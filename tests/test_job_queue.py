@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from src.export_data import job_queue
+from src.export_data.job_queue import DONE, FAILED, PENDING, JobQueue, backoff_delay
+
+# Retry delay in the tests instead of the jittered exponential backoff
+RETRY_DELAY = 0.2
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, 'backoff_delay', lambda attempts: RETRY_DELAY)
+    queue = JobQueue(tmp_path / 'jobs.sqlite', max_attempts=3)
+    yield queue
+    queue.close()
+
+
+def activities(*ids):
+    return [{'id': activity_id, 'name': f"Ride {activity_id}"} for activity_id in ids]
+
+
+def test_claims_every_job_once_and_keeps_the_summaries(queue):
+    queue.enqueue(activities(3, 1, 2))
+
+    claimed = []
+    while (activity := queue.claim()) is not None:
+        claimed.append(activity['id'])
+        queue.complete(activity['id'], {'id': activity['id']})
+
+    assert claimed == [1, 2, 3]
+    assert queue.summaries([3, 1, 2, 4]) == [{'id': 3}, {'id': 1}, {'id': 2}]
+    assert queue.counts() == {DONE: 3}
+
+
+def test_failed_job_is_retried_after_the_backoff(queue):
+    queue.enqueue(activities(1))
+    queue.claim()
+
+    assert queue.fail(1, RuntimeError("timeout")) == PENDING
+    started = time.monotonic()
+    assert queue.claim()['id'] == 1
+    assert time.monotonic() - started >= RETRY_DELAY * 0.9
+
+
+def test_gives_up_after_max_attempts_until_enqueued_again(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, 'backoff_delay', lambda attempts: 0)
+    queue.enqueue(activities(1))
+
+    states = []
+    while (activity := queue.claim()) is not None:
+        states.append(queue.fail(activity['id'], RuntimeError("no activity details returned")))
+
+    assert states == [PENDING, PENDING, FAILED]
+    assert queue.counts() == {FAILED: 1}
+
+    queue.enqueue(activities(1))
+    assert queue.claim()['id'] == 1
+
+
+def test_running_jobs_are_resumed_after_a_crash(tmp_path):
+    path = tmp_path / 'jobs.sqlite'
+    crashed = JobQueue(path)
+    crashed.enqueue(activities(1, 2))
+    crashed.claim()
+    crashed.close()
+
+    queue = JobQueue(path)
+    assert queue.counts() == {PENDING: 2}
+    queue.close()
+
+
+def test_summaries_of_another_version_are_recomputed(queue):
+    queue.enqueue(activities(1, 2), 'v1')
+    while (activity := queue.claim()) is not None:
+        queue.complete(activity['id'], {'id': activity['id']}, 'v1')
+
+    queue.enqueue(activities(1, 2), 'v1')
+    assert queue.claim() is None
+
+    queue.enqueue(activities(1, 2), 'v2')
+    assert queue.counts() == {PENDING: 2}
+
+
+def test_backoff_delay_is_capped_full_jitter():
+    for attempts in range(12):
+        delays = [backoff_delay(attempts, base=2.0, cap=300.0) for _ in range(50)]
+        assert all(0 <= delay <= min(300.0, 2.0 * 2 ** attempts) for delay in delays)
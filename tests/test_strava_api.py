@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+from src.export_data import strava_api
+from src.export_data.strava_api import RateLimiter, StravaClient, parse_quota
+
+# Quota windows last this long in the tests instead of 15 minutes
+WINDOW_RESET = 0.2
+
+
+@pytest.fixture(autouse=True)
+def short_windows(monkeypatch):
+    # Emptied buckets refill over WINDOW_SECONDS, blocks last until the next reset
+    monkeypatch.setattr(strava_api, 'WINDOW_SECONDS', WINDOW_RESET)
+    monkeypatch.setattr(strava_api, 'seconds_until_window_reset', lambda: WINDOW_RESET)
+
+
+def client_for(server, **kwargs):
+    return StravaClient('test-token', base_url=server.url, **kwargs)
+
+
+def test_retries_after_429_once_the_window_resets(fake_strava):
+    server = fake_strava(activities=1, rate_limited=2)
+    client = client_for(server)
+
+    started = time.monotonic()
+    details = client.get_activity_details(1000)
+
+    assert details['id'] == 1000
+    assert len(server.requests) == 3
+    # Each 429 blocks the limiter until the window resets
+    assert time.monotonic() - started >= 2 * WINDOW_RESET
+
+
+def test_gives_up_after_max_retries(fake_strava):
+    server = fake_strava(activities=1, rate_limited=10)
+    client = client_for(server, max_retries=1)
+
+    assert client.get_activity_details(1000) is None
+    assert len(server.requests) == 2
+
+
+def test_exhausted_window_in_quota_headers_pauses_requests(fake_strava):
+    # The first response reports the 15-minute quota as used up
+    server = fake_strava(activities=1, limits=(10, 1000), usage=(9, 9))
+    client = client_for(server)
+
+    client.get_activity_details(1000)
+    started = time.monotonic()
+    client.get_activity_details(1000)
+
+    assert time.monotonic() - started >= WINDOW_RESET
+    assert len(server.requests) == 2
+
+
+def test_quota_headers_resynchronise_the_bucket(fake_strava):
+    server = fake_strava(activities=1, limits=(100, 1000), usage=(59, 499))
+    limiter = RateLimiter()
+    client_for(server, rate_limiter=limiter).get_activity_details(1000)
+
+    assert (limiter.short_limit, limiter.daily_limit) == (100, 1000)
+    assert limiter.tokens <= 40
+    assert limiter.daily_remaining == 500
+
+
+def test_tighter_read_quota_wins():
+    headers = {
+        'X-RateLimit-Limit': '200,2000',
+        'X-RateLimit-Usage': '10,100',
+        'X-ReadRateLimit-Limit': '100,1000',
+        'X-ReadRateLimit-Usage': '95,100',
+    }
+    assert parse_quota(headers) == ((100, 1000), (95, 100))
+    assert parse_quota({}) is None
+
+
+@pytest.mark.parametrize('activities, pages', [(0, 1), (150, 1), (450, 3), (400, 3)])
+def test_pagination_stops_at_the_first_short_page(fake_strava, activities, pages):
+    server = fake_strava(activities=activities)
+    client = client_for(server)
+
+    listed = list(client.iter_activities(per_page=200))
+
+    assert [activity['id'] for activity in listed] == [activity['id'] for activity in server.activities]
+    assert [int(query['page'][0]) for _, query in server.requests] == list(range(1, pages + 1))
@@ -0,0 +1,59 @@
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from src.export_data.stream_store import STORE_SCHEMA, append_activities, read_activity, read_index, scan_streams
+from src.export_data.strava_streams import STREAM_SCHEMA
+
+
+def activity(activity_id, start_date, sport_type='Ride', samples=120):
+    """Details and a typed stream frame of a made-up activity"""
+    details = {'id': activity_id, 'sport_type': sport_type, 'start_date': start_date}
+    frame = pl.DataFrame({
+        'time': list(range(0, samples * 2, 2)),
+        'watts': [activity_id % 400 + i % 50 for i in range(samples)],
+        'heartrate': [120 + i % 40 for i in range(samples)],
+    }).with_columns(
+        pl.lit(None).alias(name) for name in STREAM_SCHEMA if name not in ('time', 'watts', 'heartrate')
+    ).select(STREAM_SCHEMA.keys()).cast(STREAM_SCHEMA)
+    return details, frame
+
+
+def part_files(store_dir):
+    return sorted(path.relative_to(store_dir).parent.as_posix() for path in store_dir.rglob('*.parquet'))
+
+
+def test_appends_rewrite_each_partition_as_one_file(tmp_path):
+    batches = [
+        [activity(3, '2025-03-20T07:00:00Z'), activity(10, '2025-04-01T07:00:00Z', 'Run')],
+        [activity(1, '2025-03-02T07:00:00Z')],
+        [activity(2, '2025-03-10T07:00:00Z', samples=7), activity(11, '2025-04-03T07:00:00Z', 'Run')],
+    ]
+    for batch in batches:
+        append_activities(batch, tmp_path)
+
+    assert part_files(tmp_path) == ['sport_type=Ride/month=2025-03', 'sport_type=Run/month=2025-04']
+    for details, frame in [pair for batch in batches for pair in batch]:
+        stored = read_activity(details['id'], tmp_path)
+        assert_frame_equal(stored.drop('activity_id'), frame)
+
+    # Rows of a partition stay sorted by activity_id, offsets follow that order
+    rides = read_index(tmp_path)['activities']
+    assert [rides[activity_id]['offset'] for activity_id in ('1', '2', '3')] == [0, 120, 127]
+
+
+def test_stored_activities_are_skipped(tmp_path):
+    assert append_activities([activity(1, '2025-03-02T07:00:00Z')], tmp_path) == 1
+    assert append_activities([activity(1, '2025-03-02T07:00:00Z'), activity(2, '2025-03-03T07:00:00Z')], tmp_path) == 1
+    assert len(read_activity(1, tmp_path)) == 120
+
+
+def test_scan_selects_activities(tmp_path):
+    append_activities([activity(1, '2025-03-02T07:00:00Z'), activity(2, '2025-03-10T07:00:00Z'),
+                       activity(3, '2025-03-12T07:00:00Z', 'Run')], tmp_path)
+
+    selected = scan_streams(tmp_path, activity_ids=['2', '3']).select('activity_id').unique().collect()
+    rides = scan_streams(tmp_path, sport_types=['Ride']).select('activity_id').unique().collect()
+
+    assert sorted(selected['activity_id']) == [2, 3]
+    assert sorted(rides['activity_id']) == [1, 2]
+    assert scan_streams(tmp_path).collect_schema()['activity_id'] == STORE_SCHEMA['activity_id']
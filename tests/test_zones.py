@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from src.export_data.zones import (
+    calculate_hr_zones,
+    calculate_power_zones,
+    calculate_time_in_zones,
+    sample_durations,
+    time_in_zones_batch,
+)
+
+
+def reference_time_in_zones(stream_data, zones, metric):
+    """The per-sample loop the searchsorted engine replaced"""
+    if metric not in stream_data or 'time' not in stream_data:
+        return None
+    values = stream_data[metric]
+    times = stream_data['time']
+    time_diffs = [times[i] - times[i - 1] for i in range(1, len(times))]
+    if time_diffs:
+        time_diffs.append(sum(time_diffs) / len(time_diffs))
+
+    time_in_zones = {zone_name: 0 for zone_name in zones}
+    for i, value in enumerate(values):
+        if value is None:
+            continue
+        for zone_name, (zone_min, zone_max) in zones.items():
+            if zone_min <= value < zone_max:
+                time_in_zones[zone_name] += time_diffs[i]
+                break
+    return time_in_zones
+
+
+def random_stream(rng, metric, low, high, samples):
+    """Smart-sampled stream with dropouts and values outside every zone"""
+    times = np.cumsum(rng.choice([1, 1, 1, 2, 5], size=samples)).tolist()
+    values = [None if rng.random() < 0.05 else int(value) for value in rng.integers(low, high, size=samples)]
+    return {'time': times, metric: values}
+
+
+@pytest.mark.parametrize('metric, zones, low, high', [
+    ('heartrate', calculate_hr_zones(190), 40, 210),
+    ('watts', calculate_power_zones(330), 0, 800),
+])
+def test_batch_matches_the_per_sample_loop(metric, zones, low, high):
+    rng = np.random.default_rng(7)
+    activities = [random_stream(rng, metric, low, high, samples) for samples in (2, 60, 1800, 3600)]
+    # Activities without the metric or without a time stream have no zones
+    activities += [{'time': [0, 1, 2]}, {metric: [150, 160]}]
+
+    batch = time_in_zones_batch(activities, zones, metric)
+
+    for stream_data, result in zip(activities, batch):
+        expected = reference_time_in_zones(stream_data, zones, metric)
+        if expected is None:
+            assert result is None
+            continue
+        assert list(result) == list(zones)
+        assert result == pytest.approx(expected)
+
+
+def test_single_activity_matches_the_batch():
+    rng = np.random.default_rng(11)
+    stream_data = random_stream(rng, 'watts', 0, 800, 600)
+    zones = calculate_power_zones(250)
+
+    assert calculate_time_in_zones(stream_data, zones, 'watts') == time_in_zones_batch([stream_data], zones, 'watts')[0]
+
+
+def test_nan_samples_are_skipped():
+    zones = calculate_hr_zones(200)
+    stream_data = {'time': np.array([0.0, 1.0, 2.0, 3.0]), 'heartrate': np.array([110.0, np.nan, 130.0, 190.0])}
+
+    result = calculate_time_in_zones(stream_data, zones, 'heartrate')
+
+    assert result == {
+        'Zone 1 (Recovery)': 1.0,
+        'Zone 2 (Endurance)': 1.0,
+        'Zone 3 (Tempo)': 0.0,
+        'Zone 4 (Threshold)': 0.0,
+        'Zone 5 (VO2 Max)': 1.0,
+    }
+
+
+def test_sample_durations():
+    assert sample_durations([0, 1, 3, 6]).tolist() == [1.0, 2.0, 3.0, 2.0]
+    assert sample_durations([5]).tolist() == [0.0]